@@ -3,6 +3,8 @@
 import importlib
 import inspect
 import pkgutil
+import threading
+from contextvars import ContextVar
 from pathlib import Path
 from typing import Any, Callable
 
@@ -12,6 +14,14 @@ class ToolRegistry:
 
     def __init__(self):
         self._tools: list[dict[str, Any]] = []
+        self._by_name: dict[str, dict[str, Any]] = {}
+        # Tool modules found by discover_tools() that are imported on first use
+        self._pending: list[str] = []
+        self._lock = threading.Lock()
+        # Held while importing; reentrant in case a tool module looks up tools
+        self._load_lock = threading.RLock()
+        # Messages API tool definitions, rebuilt when a tool is registered
+        self._params: list[dict[str, Any]] | None = None
 
     def register(self, name: str, description: str, func: Callable[..., Any]) -> Callable[..., Any]:
         """Register a tool with the registry."""
@@ -22,9 +32,37 @@ class ToolRegistry:
             "input_schema": input_schema,
             "function": func,
         }
-        self._tools.append(tool_def)
+        with self._lock:
+            self._tools.append(tool_def)
+            self._by_name[name] = tool_def
+            self._params = None
         return func
 
+    def defer(self, module_name: str) -> None:
+        """Import `module_name` the first time tools are looked up."""
+        with self._lock:
+            if module_name not in self._pending:
+                self._pending.append(module_name)
+
+    def load_pending(self) -> None:
+        """Import the deferred tool modules, registering their tools."""
+        if not self._pending:
+            return
+        with self._load_lock:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        return
+                    module_name = self._pending[0]
+                try:
+                    importlib.import_module(module_name)
+                except Exception as e:
+                    print(f"Warning: Failed to import tool module {module_name}: {e}")
+                # Removed only once imported, so no caller sees a partial registry
+                with self._lock:
+                    if module_name in self._pending:
+                        self._pending.remove(module_name)
+
     def _generate_input_schema(self, func: Callable[..., Any]) -> dict[str, Any]:
         """Generate input_schema from function signature and docstring."""
         sig = inspect.signature(func)
@@ -74,6 +112,7 @@ class ToolRegistry:
 
     def get_tools(self) -> list[dict[str, Any]]:
         """Get all registered tools as Anthropic-format tool definitions with functions."""
+        self.load_pending()
         return [
             {
                 "name": tool["name"],
@@ -84,9 +123,39 @@ class ToolRegistry:
             for tool in self._tools
         ]
 
+    def get_tool_params(self) -> list[dict[str, Any]]:
+        """Get the tool definitions to send to the Messages API, without functions.
+
+        The list is built once and reused until the registry changes, so the
+        schemas are not regenerated and the request prefix stays cacheable.
+        """
+        self.load_pending()
+        with self._lock:
+            if self._params is None:
+                self._params = [
+                    {
+                        "name": tool["name"],
+                        "description": tool["description"],
+                        "input_schema": tool["input_schema"],
+                    }
+                    for tool in self._tools
+                ]
+            return self._params
+
+    def call(self, name: str, arguments: dict[str, Any]) -> Any:
+        """Call the tool `name` with keyword `arguments`."""
+        self.load_pending()
+        tool_def = self._by_name.get(name)
+        if tool_def is None:
+            raise KeyError(f"Unknown tool: {name}")
+        return tool_def["function"](**arguments)
+
     def clear(self):
         """Clear all registered tools."""
-        self._tools.clear()
+        with self._lock:
+            self._tools.clear()
+            self._by_name.clear()
+            self._params = None
 
 
 # Global registry instance
@@ -110,7 +179,10 @@ def tool(name: str, description: str):
 
 
 def discover_tools(package_path: str | None = None) -> None:
-    """Auto-discover and load all tools from the tools package.
+    """Auto-discover all tools from the tools package.
+
+    Modules are only found here; they are imported the first time tools are
+    looked up, so importing the agent does not pay for every tool module.
 
     Args:
         package_path: Path to the tools package. Defaults to the 'tools' folder.
@@ -131,12 +203,13 @@ def discover_tools(package_path: str | None = None) -> None:
         if module_name.startswith("_"):
             continue
 
-        # Import the module to trigger @tool decorators
-        full_module_name = f"agent_tools.{module_name}"
-        try:
-            importlib.import_module(full_module_name)
-        except Exception as e:
-            print(f"Warning: Failed to import tool module {full_module_name}: {e}")
+        # Importing the module later triggers its @tool decorators
+        _registry.defer(f"agent_tools.{module_name}")
+
+
+def load_tools() -> None:
+    """Import the discovered tool modules now instead of on first use."""
+    _registry.load_pending()
 
 
 def get_registry() -> ToolRegistry:
@@ -147,3 +220,27 @@ def get_registry() -> ToolRegistry:
 def get_tools() -> list[dict[str, Any]]:
     """Get all registered tools with functions."""
     return _registry.get_tools()
+
+
+def get_tool_params() -> list[dict[str, Any]]:
+    """Get all registered tools as Messages API tool definitions."""
+    return _registry.get_tool_params()
+
+
+def call_tool(name: str, arguments: dict[str, Any]) -> Any:
+    """Call a registered tool by name."""
+    return _registry.call(name, arguments)
+
+
+# Context of the agent whose REPL code is running, for tools that operate on it
+_active_context: ContextVar[Any] = ContextVar("agent_tools_active_context", default=None)
+
+
+def set_active_context(context: Any) -> None:
+    """Set the context that context-aware tools use by default."""
+    _active_context.set(context)
+
+
+def get_active_context() -> Any:
+    """Get the context of the agent currently running tool code."""
+    return _active_context.get()
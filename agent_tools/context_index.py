@@ -0,0 +1,276 @@
+"""Indexed search tools over the agent's context."""
+
+import heapq
+import math
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Any, Iterator
+
+from agent_tools import get_active_context, tool
+
+_TOKEN_RE = re.compile(r"\w+")
+_SNIPPET_LENGTH = 200
+_MAX_RANGE_LINES = 200
+_MAX_INDEXES = 8
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def _required_literals(pattern: str) -> list[str]:
+    """Return literal substrings every match of `pattern` must contain.
+
+    This is a conservative scan: anything it does not understand ends the
+    current literal, and patterns with alternation, optional groups or any
+    `(?...)` construct other than plain and named groups (flags, lookarounds,
+    backreferences) yield no literals at all, which disables prefiltering.
+    """
+    if "|" in pattern:
+        return []
+    if re.search(r"\)[?*{]", pattern):
+        return []
+    literals: list[str] = []
+    run: list[str] = []
+
+    def flush() -> None:
+        if len(run) >= 3:
+            literals.append("".join(run))
+        run.clear()
+
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\":
+            escaped = pattern[i + 1 : i + 2]
+            if escaped and not escaped.isalnum():
+                run.append(escaped)
+            else:
+                flush()
+            i += 2
+        elif ch in "?*{":
+            # The previous character may be absent from a match
+            if run:
+                run.pop()
+            flush()
+            if ch == "{":
+                close = pattern.find("}", i)
+                i = len(pattern) if close < 0 else close + 1
+            else:
+                i += 1
+        elif ch == "+":
+            flush()
+            i += 1
+        elif ch == "[":
+            flush()
+            i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            i += 1
+        elif ch == "(" and pattern.startswith("?", i + 1):
+            flush()
+            if pattern.startswith("(?:", i):
+                i += 3
+            elif pattern.startswith("(?P<", i) and pattern.find(">", i) >= 0:
+                i = pattern.find(">", i) + 1
+            else:
+                return []
+        elif ch in ".^$()":
+            flush()
+            i += 1
+        else:
+            run.append(ch)
+            i += 1
+    flush()
+    return literals
+
+
+class ContextIndex:
+    """Line-oriented index over a context.
+
+    Line offsets are computed up front; the token and trigram postings are
+    built on the first keyword or regex search and then reused.
+    """
+
+    def __init__(self, context: Any):
+        if not isinstance(context, str) and not callable(getattr(context, "lines", None)):
+            context = str(context)
+        self._context = context
+        self._lock = threading.Lock()
+        self._tokens: dict[str, array[int]] | None = None
+        self._trigrams: dict[str, array[int]] | None = None
+        self._starts = array("Q")
+        if isinstance(context, str):
+            pos = 0
+            while pos < len(context):
+                self._starts.append(pos)
+                newline = context.find("\n", pos)
+                if newline < 0:
+                    break
+                pos = newline + 1
+        else:
+            for offset, _ in context.lines():
+                self._starts.append(offset)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def line(self, number: int) -> str:
+        """Return line `number` (0-based) without its newline."""
+        start = self._starts[number]
+        end = self._starts[number + 1] if number + 1 < len(self._starts) else len(self._context)
+        return self._context[start:end].rstrip("\r\n")
+
+    def _iter_lines(self) -> Iterator[tuple[int, str]]:
+        for number in range(len(self._starts)):
+            yield number, self.line(number)
+
+    def _build_tokens(self) -> dict[str, array[int]]:
+        with self._lock:
+            if self._tokens is None:
+                tokens: dict[str, array[int]] = {}
+                for number, text in self._iter_lines():
+                    for token in set(_TOKEN_RE.findall(text.lower())):
+                        tokens.setdefault(token, array("I")).append(number)
+                self._tokens = tokens
+            return self._tokens
+
+    def _build_trigrams(self) -> dict[str, array[int]]:
+        with self._lock:
+            if self._trigrams is None:
+                trigrams: dict[str, array[int]] = {}
+                for number, text in self._iter_lines():
+                    for gram in _trigrams(text.lower()):
+                        trigrams.setdefault(gram, array("I")).append(number)
+                self._trigrams = trigrams
+            return self._trigrams
+
+    def _snippet(self, text: str, needle: str) -> str:
+        if len(text) <= _SNIPPET_LENGTH:
+            return text
+        pos = max(0, text.lower().find(needle.lower()))
+        start = max(0, pos - _SNIPPET_LENGTH // 4)
+        return ("..." if start else "") + text[start : start + _SNIPPET_LENGTH] + "..."
+
+    def search(self, query: str, limit: int = 10) -> list[dict[str, Any]]:
+        """Rank lines by the summed IDF of the query terms they contain."""
+        tokens = self._build_tokens()
+        terms = set(_TOKEN_RE.findall(query.lower()))
+        total = max(1, len(self))
+        scores: dict[int, float] = {}
+        for term in terms:
+            postings = tokens.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + total / len(postings))
+            for number in postings:
+                scores[number] = scores.get(number, 0.0) + idf
+        phrase = query.lower().strip()
+        ranked: list[dict[str, Any]] = []
+        for number, score in heapq.nlargest(
+            max(limit, 1) * 4, scores.items(), key=lambda item: (item[1], -item[0])
+        ):
+            text = self.line(number)
+            if phrase and phrase in text.lower():
+                score += 1.0  # Prefer lines containing the exact phrase
+            lowered = text.lower()
+            needle = next((term for term in terms if term in lowered), "")
+            ranked.append(
+                {
+                    "line": number + 1,
+                    "score": round(score, 3),
+                    "snippet": self._snippet(text, needle),
+                }
+            )
+        ranked.sort(key=lambda hit: (-hit["score"], hit["line"]))
+        return ranked[:limit]
+
+    def grep(self, pattern: str, limit: int = 50, ignore_case: bool = False) -> list[dict[str, Any]]:
+        """Return lines matching `pattern`, scanning only trigram candidates."""
+        regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+        candidates: set[int] | None = None
+        literals = _required_literals(pattern)
+        if literals:
+            trigrams = self._build_trigrams()
+            for literal in literals:
+                for gram in _trigrams(literal.lower()):
+                    postings = set(trigrams.get(gram, ()))
+                    candidates = postings if candidates is None else candidates & postings
+                    if not candidates:
+                        return []
+        numbers = sorted(candidates) if candidates is not None else range(len(self))
+        hits: list[dict[str, Any]] = []
+        for number in numbers:
+            text = self.line(number)
+            match = regex.search(text)
+            if match:
+                hits.append({"line": number + 1, "snippet": self._snippet(text, match.group())})
+                if len(hits) >= limit:
+                    break
+        return hits
+
+    def lines(self, start: int, end: int) -> str:
+        """Return 1-based lines `start` through `end`, prefixed with their numbers."""
+        start = max(1, start)
+        end = min(len(self), end, start + _MAX_RANGE_LINES - 1)
+        return "\n".join(f"{number}: {self.line(number - 1)}" for number in range(start, end + 1))
+
+
+# Indexes by context identity, holding the context so its id stays unique
+_indexes: OrderedDict[Any, tuple[Any, ContextIndex]] = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(context: Any = None) -> ContextIndex:
+    """Return the shared index for `context`, defaulting to the active context."""
+    if context is None:
+        context = get_active_context()
+    if context is None:
+        raise ValueError("No context available to index")
+    memo_key = getattr(context, "memo_key", None)
+    key = ("key", memo_key()) if callable(memo_key) else ("id", id(context))
+    with _indexes_lock:
+        entry = _indexes.get(key)
+        if entry is not None:
+            _indexes.move_to_end(key)
+            return entry[1]
+    index = ContextIndex(context)
+    with _indexes_lock:
+        entry = _indexes.setdefault(key, (context, index))
+        _indexes.move_to_end(key)
+        while len(_indexes) > _MAX_INDEXES:
+            _indexes.popitem(last=False)
+    return entry[1]
+
+
+@tool(
+    name="search_context",
+    description="Keyword search over the context. Returns up to `limit` lines ranked by relevance as dicts with line number, score and snippet.",
+)
+def search_context(query: str, limit: int = 10, _context: Any = None):
+    """query: Keywords to look for
+    limit: Maximum number of results"""
+    return get_index(_context).search(query, limit)
+
+
+@tool(
+    name="grep_context",
+    description="Regex search over the lines of the context, prefiltered by a trigram index. Returns up to `limit` matching lines as dicts with line number and snippet.",
+)
+def grep_context(pattern: str, limit: int = 50, ignore_case: bool = False, _context: Any = None):
+    """pattern: Python regular expression matched against each line
+    limit: Maximum number of results
+    ignore_case: Match case-insensitively"""
+    return get_index(_context).grep(pattern, limit, ignore_case)
+
+
+@tool(
+    name="context_lines",
+    description="Return a range of lines of the context (1-based, inclusive, at most 200 lines), each prefixed with its line number.",
+)
+def context_lines(start: int, end: int, _context: Any = None):
+    """start: First line number (1-based)
+    end: Last line number (inclusive)"""
+    return get_index(_context).lines(start, end)
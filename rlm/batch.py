@@ -0,0 +1,197 @@
+"""Resumable batch execution of agent tasks from a JSONL file."""
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterator
+
+from rlm.metrics import percentile
+
+# Fields tried in order for the task ID and context of a JSONL record
+ID_FIELDS = ("id", "request_id", "task_id")
+CONTEXT_FIELDS = ("context", "body", "input", "prompt")
+
+
+@dataclass
+class BatchTask:
+    id: str
+    context: Any
+    task: str | None = None
+    context_file: str | None = None
+    system_prompt: str | None = None
+
+
+def load_tasks(path: str) -> Iterator[BatchTask]:
+    """Read tasks lazily from a JSONL file.
+
+    A record needs a context (`context`, `body`, `input` or `prompt`) or a
+    `context_file`; `task` and `system_prompt` are optional. The ID is `id`,
+    `request_id` or `task_id`, or the line number if none is present. A
+    record that is a plain string is used as the context.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no}: invalid JSON: {e}") from e
+            if not isinstance(record, dict):
+                yield BatchTask(str(line_no), record)
+                continue
+            task_id = next((record[k] for k in ID_FIELDS if k in record), line_no)
+            context = next((record[k] for k in CONTEXT_FIELDS if k in record), None)
+            if context is None and "context_file" not in record:
+                raise ValueError(f"{path}:{line_no}: record has no context")
+            yield BatchTask(
+                id=str(task_id),
+                context=context,
+                task=record.get("task"),
+                context_file=record.get("context_file"),
+                system_prompt=record.get("system_prompt"),
+            )
+
+
+class Checkpoint:
+    """Append-only record of finished task IDs.
+
+    An ID is added only after its result line is flushed to the output file.
+    A crash between the two leaves a result without its ID, so `recover`
+    adds the IDs of the results already in the output file before a batch
+    resumes; together they skip exactly the tasks whose results are on disk.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done: set[str] = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.done.update(line.rstrip("\n") for line in f if line.strip())
+        self._file = open(path, "a", encoding="utf-8")
+
+    def add(self, task_id: str) -> None:
+        self.done.add(task_id)
+        self._file.write(task_id + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def recover(self, output_path: str) -> None:
+        """Add finished tasks whose result reached `output_path` but not the checkpoint."""
+        if not os.path.exists(output_path):
+            return
+        with open(output_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # A line cut short by the crash
+                if not isinstance(record, dict) or record.get("status") == "error":
+                    continue
+                task_id = str(record.get("id"))
+                if task_id not in self.done:
+                    self.add(task_id)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+@dataclass
+class BatchReport:
+    started: float = field(default_factory=time.monotonic)
+    skipped: int = 0
+    statuses: dict[str, int] = field(default_factory=dict)
+    latencies: list[float] = field(default_factory=list)
+
+    def record(self, status: str, latency: float) -> None:
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.latencies.append(latency)
+
+    def format(self) -> str:
+        elapsed = time.monotonic() - self.started
+        finished = len(self.latencies)
+        return "\n".join(
+            [
+                "Batch summary:",
+                f"  Tasks: {finished} run, {self.skipped} skipped (already done), "
+                f"statuses {self.statuses}",
+                f"  Throughput: {finished / elapsed if elapsed > 0 else 0.0:.2f} tasks/s "
+                f"over {elapsed:.1f}s",
+                f"  Latency: p50 {percentile(self.latencies, 50):.2f}s, "
+                f"p95 {percentile(self.latencies, 95):.2f}s, "
+                f"max {max(self.latencies, default=0.0):.2f}s",
+            ]
+        )
+
+
+def _end_last_line(path: str) -> None:
+    """Terminate a result line left incomplete by a crash, so appends start cleanly."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+async def run_batch(
+    tasks: Iterator[BatchTask],
+    run_task: Callable[[BatchTask], Awaitable[tuple[str, Any]]],
+    output_path: str,
+    checkpoint: Checkpoint,
+    workers: int = 4,
+    on_done: Callable[[BatchTask, str, float], None] | None = None,
+    report: BatchReport | None = None,
+) -> BatchReport:
+    """Run `tasks` with up to `workers` at a time, streaming results to JSONL.
+
+    `run_task` returns `(status, result)`; exceptions are recorded with
+    status "error" and are not checkpointed, so they are retried on the next
+    run. Tasks are read lazily, so the input can be much larger than memory.
+    Pass `report` to keep the statistics of an interrupted batch.
+    """
+    report = report if report is not None else BatchReport()
+    checkpoint.recover(output_path)
+    _end_last_line(output_path)
+    semaphore = asyncio.Semaphore(max(1, workers))
+    running: set[asyncio.Task[None]] = set()
+
+    with open(output_path, "a", encoding="utf-8") as out:
+
+        async def run_one(task: BatchTask) -> None:
+            start = time.monotonic()
+            try:
+                status, result = await run_task(task)
+                error = None
+            except Exception as e:
+                status, result, error = "error", None, f"{type(e).__name__}: {e}"
+            latency = time.monotonic() - start
+            record = {"id": task.id, "status": status, "result": result, "latency": round(latency, 3)}
+            if error is not None:
+                record["error"] = error
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+            if status != "error":
+                checkpoint.add(task.id)
+            report.record(status, latency)
+            if on_done is not None:
+                on_done(task, status, latency)
+
+        try:
+            for task in tasks:
+                if task.id in checkpoint.done:
+                    report.skipped += 1
+                    continue
+                await semaphore.acquire()
+                job = asyncio.create_task(run_one(task))
+                running.add(job)
+                job.add_done_callback(running.discard)
+                job.add_done_callback(lambda _: semaphore.release())
+            if running:
+                await asyncio.gather(*running)
+        finally:
+            for job in running:
+                job.cancel()
+    return report
@@ -0,0 +1,145 @@
+"""Iteration, token and wall-clock budgets for agent trees."""
+
+import contextvars
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass(frozen=True)
+class BudgetLimits:
+    """Limits of one agent; `None` disables a limit.
+
+    `max_iterations` counts the model calls of the agent itself. Token and
+    time limits cover the agent together with all of its sub-agents, and every
+    sub-agent is also bound by the budgets of all its ancestors.
+    """
+
+    max_iterations: int | None = 50
+    max_input_tokens: int | None = None
+    max_output_tokens: int | None = None
+    max_seconds: float | None = None
+    # Fraction of any limit at which the agent is told to wrap up
+    wrap_up_at: float = 0.8
+
+
+@dataclass
+class PartialResult:
+    """Returned by an agent that stopped before calling FINAL."""
+
+    # "iterations", "input_tokens", "output_tokens", "time" or "no_progress"
+    reason: str
+    # Last text or REPL output the agent produced
+    partial: str
+    usage: dict[str, Any] = field(default_factory=dict)
+
+    def __str__(self) -> str:
+        return f"[agent stopped early: {self.reason}] {self.partial}"
+
+
+class Budget:
+    """Usage of one agent, charged to it and to every ancestor."""
+
+    def __init__(self, limits: BudgetLimits, parent: "Budget | None" = None):
+        self.limits = limits
+        self.parent = parent
+        self.started = time.monotonic()
+        self.iterations = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def _chain(self) -> list["Budget"]:
+        chain: list[Budget] = []
+        node: Budget | None = self
+        while node is not None:
+            chain.append(node)
+            node = node.parent
+        return chain
+
+    def next_iteration(self) -> None:
+        with self._lock:
+            self.iterations += 1
+
+    def charge(self, input_tokens: int, output_tokens: int) -> None:
+        """Record the tokens of one model call of this agent."""
+        for node in self._chain():
+            with node._lock:
+                node.input_tokens += input_tokens
+                node.output_tokens += output_tokens
+
+    def restore(self, usage: dict[str, Any]) -> None:
+        """Continue from the counters of a checkpoint; the clock starts afresh.
+
+        Only this budget is set: the usage of a resumed sub-agent is already
+        part of its ancestors' checkpoints.
+        """
+        with self._lock:
+            self.iterations = int(usage.get("iterations", 0))
+            self.input_tokens = int(usage.get("input_tokens", 0))
+            self.output_tokens = int(usage.get("output_tokens", 0))
+
+    def _fractions(self) -> dict[str, float]:
+        """Share of each limit used, the highest across the ancestor chain."""
+        now = time.monotonic()
+        used: dict[str, float] = {}
+
+        def note(reason: str, value: float, limit: float | None) -> None:
+            if limit is not None:
+                used[reason] = max(used.get(reason, 0.0), value / limit if limit > 0 else 1.0)
+
+        note("iterations", self.iterations, self.limits.max_iterations)
+        for node in self._chain():
+            note("input_tokens", node.input_tokens, node.limits.max_input_tokens)
+            note("output_tokens", node.output_tokens, node.limits.max_output_tokens)
+            note("time", now - node.started, node.limits.max_seconds)
+        return used
+
+    def exhausted(self) -> str | None:
+        """Name of the first limit that has run out, if any."""
+        for reason, fraction in self._fractions().items():
+            if fraction >= 1.0:
+                return reason
+        return None
+
+    def near_limit(self) -> str | None:
+        """Name of a limit past its wrap-up threshold, if any."""
+        for reason, fraction in self._fractions().items():
+            if fraction >= self.limits.wrap_up_at:
+                return reason
+        return None
+
+    def remaining_seconds(self) -> float | None:
+        """Time left before the tightest deadline in the chain."""
+        now = time.monotonic()
+        remaining = [
+            node.started + node.limits.max_seconds - now
+            for node in self._chain()
+            if node.limits.max_seconds is not None
+        ]
+        return max(0.0, min(remaining)) if remaining else None
+
+    def usage(self) -> dict[str, Any]:
+        return {
+            "iterations": self.iterations,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "seconds": round(time.monotonic() - self.started, 3),
+        }
+
+
+_current_budget: contextvars.ContextVar[Budget | None] = contextvars.ContextVar(
+    "rlm_current_budget", default=None
+)
+
+
+def start_budget(limits: BudgetLimits) -> Budget:
+    """Create a budget nested in the current one and make it current."""
+    budget = Budget(limits, _current_budget.get())
+    _current_budget.set(budget)
+    return budget
+
+
+def current_budget() -> Budget | None:
+    return _current_budget.get()
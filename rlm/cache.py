@@ -0,0 +1,190 @@
+"""Content-addressed on-disk cache for LLM responses."""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+CACHE_MODES = ("off", "read", "rw")
+
+
+def _to_jsonable(value: Any) -> Any:
+    """Convert SDK objects (pydantic models) into plain JSON data."""
+    model_dump = getattr(value, "model_dump", None)
+    if callable(model_dump):
+        return model_dump(mode="json", exclude_none=True)
+    return str(value)
+
+
+def request_key(request: dict[str, Any]) -> str:
+    """Return a stable hash of a messages.create request."""
+    canonical = json.dumps(
+        request,
+        default=_to_jsonable,
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+
+
+class ResponseCache:
+    """Stores responses as `<dir>/<key[:2]>/<key>.json` files.
+
+    Entries are evicted least-recently-used first once the cache grows past
+    `max_bytes`, and entries older than `max_age` seconds count as misses.
+    A hit refreshes the entry's mtime, which is what the LRU order uses.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike[str],
+        mode: str = "off",
+        max_bytes: int = 512 * 1024 * 1024,
+        max_age: float | None = None,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode {mode!r}, expected one of {CACHE_MODES}")
+        self.directory = Path(directory)
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._size: int | None = None
+
+    @property
+    def readable(self) -> bool:
+        return self.mode in ("read", "rw")
+
+    @property
+    def writable(self) -> bool:
+        return self.mode == "rw"
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Return the cached response for `key`, or None on a miss."""
+        if not self.readable:
+            return None
+        path = self._path(key)
+        try:
+            stat = path.stat()
+            if self.max_age is not None and time.time() - stat.st_mtime > self.max_age:
+                if self.writable:
+                    self._remove(path, stat.st_size)
+                raise FileNotFoundError(path)
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if self.writable:
+                os.utime(path)
+        except (OSError, json.JSONDecodeError):
+            with self._lock:
+                self.stats.misses += 1
+            return None
+        with self._lock:
+            self.stats.hits += 1
+        return data
+
+    def put(self, key: str, value: dict[str, Any]) -> None:
+        """Store `value` under `key` and evict old entries if over budget."""
+        if not self.writable:
+            return
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        # Write to a temp file first so concurrent readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stats.writes += 1
+            if self._size is not None:
+                self._size += len(payload)
+        if self._current_size() > self.max_bytes:
+            self.evict()
+
+    def _current_size(self) -> int:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, _, size in self._entries())
+            return self._size
+
+    def _entries(self) -> list[tuple[float, Path, int]]:
+        entries: list[tuple[float, Path, int]] = []
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, path, stat.st_size))
+        return entries
+
+    def _remove(self, path: Path, size: int) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            return
+        with self._lock:
+            self.stats.evictions += 1
+            if self._size is not None:
+                self._size -= size
+
+    def evict(self) -> None:
+        """Drop expired entries, then the least recently used until under budget."""
+        entries = sorted(self._entries())
+        now = time.time()
+        total = sum(size for _, _, size in entries)
+        for mtime, path, size in entries:
+            expired = self.max_age is not None and now - mtime > self.max_age
+            if not expired and total <= self.max_bytes:
+                continue
+            self._remove(path, size)
+            total -= size
+        with self._lock:
+            self._size = total
+
+    def summary(self) -> str:
+        s = self.stats
+        return f"{s.hits} hits, {s.misses} misses, {s.writes} writes, {s.evictions} evictions"
+
+
+# Global cache instance, off until configured
+_cache = ResponseCache(os.path.join(os.getcwd(), ".rlm", "cache"))
+
+
+def configure_cache(
+    mode: str,
+    directory: str | None = None,
+    max_bytes: int | None = None,
+    max_age: float | None = None,
+) -> ResponseCache:
+    """Replace the global response cache."""
+    global _cache
+    _cache = ResponseCache(
+        directory or os.path.join(os.getcwd(), ".rlm", "cache"),
+        mode=mode,
+        max_bytes=max_bytes if max_bytes is not None else _cache.max_bytes,
+        max_age=max_age,
+    )
+    return _cache
+
+
+def get_cache() -> ResponseCache:
+    """Get the global response cache instance."""
+    return _cache
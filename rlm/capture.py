@@ -0,0 +1,60 @@
+"""Bounded capture of REPL output."""
+
+import io
+from collections import deque
+
+# Default number of characters kept from the start and end of each stream
+OUTPUT_HEAD_CHARS = 1500
+OUTPUT_TAIL_CHARS = 1500
+
+
+class BoundedOutput(io.TextIOBase):
+    """Text stream that keeps only the first `head` and last `tail` characters.
+
+    Everything in between is counted but not stored, so printing a huge object
+    costs no more memory than the limits, and the end of the output (usually
+    the traceback) is kept.
+    """
+
+    def __init__(self, head: int = OUTPUT_HEAD_CHARS, tail: int = OUTPUT_TAIL_CHARS):
+        self.head_limit = head
+        self.tail_limit = tail
+        # Total number of characters written, including dropped ones
+        self.total = 0
+        self._head: list[str] = []
+        self._head_len = 0
+        self._tail: deque[str] = deque()
+        self._tail_len = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        n = len(s)
+        self.total += n
+        if self._head_len < self.head_limit:
+            part = s[: self.head_limit - self._head_len]
+            self._head.append(part)
+            self._head_len += len(part)
+            s = s[len(part) :]
+        if s and self.tail_limit > 0:
+            if len(s) > self.tail_limit:
+                s = s[-self.tail_limit :]
+            self._tail.append(s)
+            self._tail_len += len(s)
+            # Drop whole chunks that are entirely outside the tail window
+            while self._tail_len - len(self._tail[0]) >= self.tail_limit:
+                self._tail_len -= len(self._tail.popleft())
+        return n
+
+    @property
+    def dropped(self) -> int:
+        """Number of characters that were written but not kept."""
+        return self.total - self._head_len - min(self._tail_len, self.tail_limit)
+
+    def getvalue(self) -> str:
+        head = "".join(self._head)
+        tail = "".join(self._tail)[-self.tail_limit :] if self.tail_limit > 0 else ""
+        if self.dropped > 0:
+            return f"{head}\n... [{self.dropped} characters truncated] ...\n{tail}"
+        return head + tail
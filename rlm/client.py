@@ -0,0 +1,275 @@
+"""Shared API client with rate limiting and retries."""
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Awaitable, Callable, TypeVar
+
+import httpx
+from anthropic import (
+    APIConnectionError,
+    APIStatusError,
+    AsyncAnthropic,
+    DefaultAsyncHttpxClient,
+)
+
+_T = TypeVar("_T")
+
+# HTTP statuses worth retrying: timeouts, lock conflicts, rate limits, overload
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+# Error types sent in the body, e.g. inside an event stream that started with 200
+RETRYABLE_ERROR_TYPES = frozenset({"rate_limit_error", "overloaded_error", "api_error"})
+
+
+def _retryable(error: Exception) -> bool:
+    if isinstance(error, APIConnectionError):
+        return True
+    if not isinstance(error, APIStatusError):
+        return False
+    if error.status_code in RETRYABLE_STATUS:
+        return True
+    body = error.body
+    if isinstance(body, dict):
+        detail = body.get("error", body)
+        if isinstance(detail, dict) and detail.get("type") in RETRYABLE_ERROR_TYPES:
+            return True
+    return False
+
+
+def _retry_after(headers: httpx.Headers | None) -> float | None:
+    """Seconds the server asked us to wait, if it said so."""
+    if headers is None:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value) * scale)
+        except ValueError:
+            continue
+    return None
+
+
+def _reset_delay(value: str | None) -> float | None:
+    """Seconds until an RFC 3339 rate limit reset time."""
+    if not value:
+        return None
+    try:
+        reset = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return max(0.0, reset.timestamp() - time.time())
+
+
+class RateLimiter:
+    """Holds back requests while the API reports an exhausted rate limit.
+
+    State is updated from the `anthropic-ratelimit-*` headers of every
+    response and from 429 responses, and is shared by all threads and event
+    loops of the process. The local token estimate is decremented as requests
+    are sent, so a burst of concurrent requests does not overshoot the limit
+    before the next headers arrive.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # time.monotonic() before which no request is sent
+        self._blocked_until = 0.0
+        self._tokens_remaining: int | None = None
+        self._tokens_reset = 0.0
+
+    def update(self, headers: httpx.Headers) -> None:
+        now = time.monotonic()
+        with self._lock:
+            requests = headers.get("anthropic-ratelimit-requests-remaining")
+            if requests is not None and requests.isdigit() and int(requests) == 0:
+                delay = _reset_delay(headers.get("anthropic-ratelimit-requests-reset"))
+                if delay is not None:
+                    self._blocked_until = max(self._blocked_until, now + delay)
+            for prefix in ("anthropic-ratelimit-input-tokens", "anthropic-ratelimit-tokens"):
+                tokens = headers.get(f"{prefix}-remaining")
+                if tokens is None or not tokens.isdigit():
+                    continue
+                self._tokens_remaining = int(tokens)
+                delay = _reset_delay(headers.get(f"{prefix}-reset"))
+                self._tokens_reset = now + delay if delay is not None else now
+                break
+
+    def block_for(self, seconds: float) -> None:
+        """Hold back every request for `seconds`, e.g. after a 429."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def _delay(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            if self._blocked_until > now:
+                return self._blocked_until - now
+            if self._tokens_remaining is not None:
+                if self._tokens_reset <= now:
+                    # Window has reset; wait for fresh headers
+                    self._tokens_remaining = None
+                elif tokens > self._tokens_remaining:
+                    return self._tokens_reset - now
+                else:
+                    self._tokens_remaining -= tokens
+            return 0.0
+
+    async def wait(self, tokens: int = 0) -> None:
+        """Sleep until a request of about `tokens` input tokens may be sent."""
+        while (delay := self._delay(tokens)) > 0:
+            await asyncio.sleep(delay)
+
+
+@dataclass
+class _LoopClient:
+    client: AsyncAnthropic
+    semaphore: asyncio.Semaphore
+
+
+class ClientManager:
+    """Process-wide API client shared by all agents.
+
+    httpx connection pools are bound to an event loop, so one client is kept
+    per loop; an agent tree runs on a single loop, so all of its sub-agents
+    share one keep-alive pool. Calls go through `call`, which limits the
+    number of requests in flight, waits out rate limits and retries
+    transient failures with jittered exponential backoff. `client_factory`
+    replaces the API client, e.g. with an offline stand-in (see rlm.replay).
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        max_connections: int = 64,
+        max_keepalive: int = 32,
+        keepalive_expiry: float = 120.0,
+        max_retries: int = 10,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        client_factory: Callable[[], Any] | None = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limiter = RateLimiter()
+        self.client_factory = client_factory
+        self._clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClient] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    def _create_client(self) -> AsyncAnthropic:
+        if self.client_factory is not None:
+            return self.client_factory()
+
+        async def on_response(response: httpx.Response) -> None:
+            self.rate_limiter.update(response.headers)
+
+        http_client = DefaultAsyncHttpxClient(
+            limits=self.limits, event_hooks={"response": [on_response]}
+        )
+        # Retries are done by `call`, which coordinates them across agents
+        return AsyncAnthropic(http_client=http_client, max_retries=0)
+
+    def _loop_client(self) -> _LoopClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._clients.get(loop)
+            if entry is None:
+                entry = _LoopClient(
+                    self._create_client(), asyncio.Semaphore(max(1, self.max_concurrency))
+                )
+                self._clients[loop] = entry
+            return entry
+
+    def client(self) -> AsyncAnthropic:
+        """Get the client of the running event loop."""
+        return self._loop_client().client
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Delay before retry number `attempt` (from 1) after `error`."""
+        headers = error.response.headers if isinstance(error, APIStatusError) else None
+        retry_after = _retry_after(headers)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, min(1.0, self.base_delay))
+        else:
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+            delay *= random.uniform(0.5, 1.0)
+        if isinstance(error, APIStatusError) and error.status_code == 429:
+            # Everyone is over the limit, not just this request
+            self.rate_limiter.block_for(delay)
+        return delay
+
+    async def call(
+        self,
+        send: Callable[[AsyncAnthropic], Awaitable[_T]],
+        tokens: int = 0,
+        can_retry: Callable[[], bool] | None = None,
+    ) -> tuple[_T, int]:
+        """Run `send(client)` with rate limiting and retries.
+
+        `tokens` is the estimated input size used for token rate limiting.
+        `can_retry` is consulted before each retry, for requests that have
+        side effects once partially received. Returns the result and the
+        number of retries it took.
+        """
+        entry = self._loop_client()
+        attempt = 0
+        while True:
+            await self.rate_limiter.wait(tokens)
+            try:
+                async with entry.semaphore:
+                    return await send(entry.client), attempt
+            except Exception as e:
+                attempt += 1
+                if (
+                    not _retryable(e)
+                    or attempt > self.max_retries
+                    or (can_retry is not None and not can_retry())
+                ):
+                    raise
+                delay = self.backoff(attempt, e)
+                status = e.status_code if isinstance(e, APIStatusError) else type(e).__name__
+                print(
+                    f"Warning: API request failed ({status}), retrying in {delay:.1f}s "
+                    f"(attempt {attempt}/{self.max_retries})"
+                )
+                await asyncio.sleep(delay)
+
+    async def release(self) -> None:
+        """Close the client of the running event loop, e.g. before the loop ends."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._clients.pop(loop, None)
+        if entry is not None:
+            await entry.client.close()
+
+
+_manager: ClientManager | None = None
+
+
+def configure_client(**options: Any) -> ClientManager:
+    """Replace the global client manager."""
+    global _manager
+    _manager = ClientManager(**options)
+    return _manager
+
+
+def get_client_manager() -> ClientManager:
+    """Get the global client manager, creating it on first use."""
+    global _manager
+    if _manager is None:
+        _manager = ClientManager()
+    return _manager
@@ -0,0 +1,104 @@
+"""Token-budgeted compaction of agent conversations."""
+
+import json
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+COMPACTION_MODES = ("stub", "summary")
+
+COMPACTED_MARKER = "[compacted]"
+
+# Rough size of a token for English text and code, good enough for a budget
+CHARS_PER_TOKEN = 4
+
+
+def _to_jsonable(value: Any) -> Any:
+    model_dump = getattr(value, "model_dump", None)
+    if callable(model_dump):
+        return model_dump(exclude_none=True)
+    return str(value)
+
+
+def estimate_tokens(*parts: Any) -> int:
+    """Estimate the token count of request parts from their JSON size."""
+    chars = sum(
+        len(json.dumps(part, default=_to_jsonable, ensure_ascii=False))
+        for part in parts
+    )
+    return chars // CHARS_PER_TOKEN
+
+
+@dataclass
+class CompactionResult:
+    before_tokens: int
+    after_tokens: int
+    compacted_results: int
+
+
+def _tool_result_blocks(conversation: list[Any]) -> list[dict[str, Any]]:
+    """Return tool_result blocks that still carry their full output, oldest first."""
+    blocks: list[dict[str, Any]] = []
+    for message in conversation:
+        if message["role"] != "user" or isinstance(message["content"], str):
+            continue
+        for block in message["content"]:
+            if (
+                isinstance(block, dict)
+                and block.get("type") == "tool_result"
+                and not str(block.get("content", "")).startswith(COMPACTED_MARKER)
+            ):
+                blocks.append(block)
+    return blocks
+
+
+async def compact_conversation(
+    conversation: list[Any],
+    budget: int,
+    keep_recent: int = 4,
+    overhead_tokens: int = 0,
+    summarize: Callable[[list[str]], Awaitable[str]] | None = None,
+) -> CompactionResult | None:
+    """Shrink old tool results in place once the conversation exceeds `budget`.
+
+    The oldest tool results are replaced by short stubs until the estimate
+    drops to half the budget, so compaction does not run again on the next
+    turn. The `keep_recent` newest results are never touched, nor are results
+    no longer than their stub would be. Only the content
+    of tool_result blocks changes, so every tool_use keeps its tool_result.
+    With `summarize`, the replaced outputs are condensed by the model and the
+    summary is kept in the newest compacted block.
+
+    Returns None when the conversation is within budget or no result could be
+    shrunk.
+    """
+    before = estimate_tokens(conversation) + overhead_tokens
+    if before <= budget:
+        return None
+
+    candidates = _tool_result_blocks(conversation)
+    candidates = candidates[: max(0, len(candidates) - keep_recent)]
+    target = budget // 2
+    current = before
+    compacted: list[tuple[dict[str, Any], str]] = []
+    for block in candidates:
+        if current <= target:
+            break
+        original = str(block.get("content", ""))
+        stub = f"{COMPACTED_MARKER} Earlier output omitted ({len(original)} characters)."
+        if len(stub) >= len(original):
+            continue
+        block["content"] = stub
+        current -= (len(original) - len(stub)) // CHARS_PER_TOKEN
+        compacted.append((block, original))
+
+    if not compacted:
+        return None
+    if summarize is not None:
+        summary = await summarize([original for _, original in compacted])
+        last_block = compacted[-1][0]
+        last_block["content"] = (
+            f"{COMPACTED_MARKER} Summary of earlier tool outputs:\n{summary}"
+        )
+
+    after = estimate_tokens(conversation) + overhead_tokens
+    return CompactionResult(before, after, len(compacted))
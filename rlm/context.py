@@ -0,0 +1,162 @@
+"""Lazy, memory-mapped contexts for inputs too large to load into memory."""
+
+import mmap
+import os
+import re
+from typing import Any, Iterator
+
+
+class FileContext:
+    """Read-only view over a byte range of a file, backed by a shared mmap.
+
+    Offsets and lengths are in bytes. Slicing decodes only the requested
+    range, and views created by `view()` or `chunks()` share the parent's
+    mapping, so passing them to sub-agents copies nothing.
+    """
+
+    usage_hint = (
+        "context is a FileContext: a lazy view over a large file that is NOT loaded in memory. "
+        "Never call context.read() or str() on all of it. Offsets are bytes. Use len(context), "
+        "context[a:b] (decoded text), context.head(n), context.lines(start=0, limit=None) -> (offset, line), "
+        "context.chunks(size, overlap=0) -> views, context.search(pattern, max_matches=100) -> (offset, match), "
+        "context.find(text, start=0) and context.view(start, end). Views can be passed to agent()/agent_map()."
+    )
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        start: int = 0,
+        end: int | None = None,
+        encoding: str = "utf-8",
+        _buffer: "mmap.mmap | bytes | None" = None,
+    ):
+        self.path = os.path.abspath(path)
+        self.encoding = encoding
+        if _buffer is None:
+            with open(self.path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                # mmap cannot map empty files
+                _buffer = (
+                    mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+                )
+        self._buffer = _buffer
+        total = len(_buffer)
+        self.start = max(0, min(start, total))
+        self.end = total if end is None else max(self.start, min(end, total))
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def _decode(self, data: bytes) -> str:
+        return data.decode(self.encoding, errors="replace")
+
+    def _absolute(self, index: int | None, default: int) -> int:
+        if index is None:
+            return default
+        if index < 0:
+            index += len(self)
+        return self.start + max(0, min(index, len(self)))
+
+    def raw(self, start: int | None = None, end: int | None = None) -> bytes:
+        """Return the raw bytes of a range relative to this view."""
+        return self._buffer[self._absolute(start, self.start) : self._absolute(end, self.end)]
+
+    def __getitem__(self, key: int | slice) -> str:
+        if isinstance(key, slice):
+            if key.step not in (None, 1):
+                raise ValueError("FileContext slices do not support a step")
+            return self._decode(self.raw(key.start, key.stop))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("FileContext index out of range")
+        return self._decode(self.raw(key, key + 1))
+
+    def read(self) -> str:
+        """Decode the whole view. Only sensible for small views."""
+        return self._decode(self.raw())
+
+    def head(self, n: int = 100) -> str:
+        return self[:n]
+
+    def view(self, start: int = 0, end: int | None = None) -> "FileContext":
+        """Return a zero-copy sub-view; offsets are relative to this view."""
+        return FileContext(
+            self.path,
+            self._absolute(start, self.start),
+            self._absolute(end, self.end),
+            self.encoding,
+            _buffer=self._buffer,
+        )
+
+    def find(self, text: str, start: int = 0) -> int:
+        """Return the offset of `text` relative to this view, or -1."""
+        needle = text.encode(self.encoding)
+        pos = self._buffer.find(needle, self._absolute(start, self.start), self.end)
+        return pos - self.start if pos >= 0 else -1
+
+    def lines(self, start: int = 0, limit: int | None = None) -> Iterator[tuple[int, str]]:
+        """Yield `(offset, line)` pairs from byte offset `start`, without newlines."""
+        pos = self._absolute(start, self.start)
+        count = 0
+        while pos < self.end and (limit is None or count < limit):
+            newline = self._buffer.find(b"\n", pos, self.end)
+            stop = self.end if newline < 0 else newline
+            yield pos - self.start, self._decode(self._buffer[pos:stop]).rstrip("\r")
+            pos = stop + 1
+            count += 1
+
+    def chunks(self, size: int, overlap: int = 0, align_lines: bool = True) -> Iterator["FileContext"]:
+        """Yield views of about `size` bytes, each overlapping the previous by `overlap`.
+
+        With `align_lines`, chunk ends are moved forward to the next newline so
+        no line (or multi-byte character) is split between chunks, and chunk
+        starts are moved back to the start of their line, so consecutive chunks
+        share at least `overlap` bytes.
+        """
+        if size <= 0:
+            raise ValueError("size must be positive")
+        overlap = max(0, min(overlap, size - 1))
+        pos = self.start
+        while pos < self.end:
+            stop = min(pos + size, self.end)
+            if align_lines and stop < self.end:
+                newline = self._buffer.find(b"\n", stop, self.end)
+                stop = self.end if newline < 0 else newline + 1
+            yield FileContext(self.path, pos, stop, self.encoding, _buffer=self._buffer)
+            if stop >= self.end:
+                break
+            next_pos = stop - overlap
+            if align_lines and overlap:
+                newline = self._buffer.rfind(b"\n", pos, next_pos)
+                next_pos = next_pos if newline < 0 else newline + 1
+            pos = max(next_pos, pos + 1)
+
+    def search(
+        self, pattern: str, flags: int = 0, max_matches: int | None = 100
+    ) -> list[tuple[int, str]]:
+        """Return `(offset, matched_text)` for regex matches in this view."""
+        regex = re.compile(pattern.encode(self.encoding), flags)
+        matches: list[tuple[int, str]] = []
+        for match in regex.finditer(self._buffer, self.start, self.end):
+            matches.append((match.start() - self.start, self._decode(match.group())))
+            if max_matches is not None and len(matches) >= max_matches:
+                break
+        return matches
+
+    def memo_key(self) -> str:
+        """Identity of this view for memoization: file version plus byte range."""
+        stat = os.stat(self.path)
+        return f"{self.path}:{stat.st_size}:{stat.st_mtime_ns}:{self.start}:{self.end}"
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # Reopen the mapping instead of pickling its contents
+        return (FileContext, (self.path, self.start, self.end, self.encoding))
+
+    def __repr__(self) -> str:
+        return (
+            f"<FileContext {self.path!r} bytes {self.start}-{self.end} "
+            f"({len(self)} bytes), head={self.head(60)!r}>"
+        )
+
+    __str__ = __repr__
@@ -0,0 +1,185 @@
+"""Time, CPU and memory limits for REPL executions."""
+
+import contextlib
+import contextvars
+import ctypes
+import signal
+import sys
+import threading
+import time
+from code import InteractiveConsole
+from typing import Iterator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class ReplTimeout(BaseException):
+    """Raised inside REPL code that ran past its wall-clock timeout.
+
+    Derives from BaseException so `except Exception` in model code does not
+    swallow it.
+    """
+
+
+class CPULimitExceeded(BaseException):
+    """Raised inside REPL code that used up its CPU time allowance."""
+
+
+class ReplDeadline:
+    """Wall-clock timeout of one REPL execution that stops while sub-agents run.
+
+    Time the code spends blocked in `agent()` and friends is bounded by the
+    sub-agents' own budgets, so it does not count against the timeout.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self._paused = 0.0
+        self._waiting = 0
+        self._since = 0.0
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def pause(self) -> Iterator[None]:
+        with self._lock:
+            if self._waiting == 0:
+                self._since = time.monotonic()
+            self._waiting += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._waiting -= 1
+                if self._waiting == 0:
+                    self._paused += time.monotonic() - self._since
+
+    def remaining(self) -> float:
+        """Seconds left; while paused, the time left when the pause began."""
+        with self._lock:
+            now = self._since if self._waiting else time.monotonic()
+            return self.timeout - (now - self.started - self._paused)
+
+
+_current_deadline: contextvars.ContextVar[ReplDeadline | None] = contextvars.ContextVar(
+    "rlm_repl_deadline", default=None
+)
+
+
+def set_current_deadline(deadline: ReplDeadline | None) -> None:
+    """Make `deadline` the one paused by sub-agent calls from this REPL thread."""
+    _current_deadline.set(deadline)
+
+
+@contextlib.contextmanager
+def deadline_paused() -> Iterator[None]:
+    """Pause the timeout of the running REPL execution, if any."""
+    deadline = _current_deadline.get()
+    if deadline is None:
+        yield
+        return
+    with deadline.pause():
+        yield
+
+
+class ReplConsole(InteractiveConsole):
+    """InteractiveConsole that remembers the last exception raised by user code."""
+
+    last_error: BaseException | None = None
+
+    def showtraceback(self) -> None:
+        self.last_error = sys.exc_info()[1]
+        super().showtraceback()
+
+
+def interrupt_thread(thread_id: int, exc_type: type[BaseException] = ReplTimeout) -> bool:
+    """Raise `exc_type` asynchronously in another thread.
+
+    The exception is delivered at the thread's next bytecode boundary, so a
+    thread blocked inside a long C call is only interrupted once it returns.
+    """
+    return (
+        ctypes.pythonapi.PyThreadState_SetAsyncExc(
+            ctypes.c_ulong(thread_id), ctypes.py_object(exc_type)
+        )
+        == 1
+    )
+
+
+def clear_interrupt(thread_id: int) -> None:
+    """Cancel an asynchronous exception that has not been delivered yet."""
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(thread_id), None)
+
+
+def apply_memory_limit(max_bytes: int | None) -> None:
+    """Cap the address space of the current process (no-op where unsupported)."""
+    if max_bytes is None or resource is None:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        max_bytes = min(max_bytes, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, hard))
+
+
+def _raise_cpu_limit(signum: int, frame: object) -> None:
+    raise CPULimitExceeded()
+
+
+@contextlib.contextmanager
+def cpu_limit(seconds: float | None) -> Iterator[None]:
+    """Raise CPULimitExceeded once this process uses `seconds` more CPU time.
+
+    Must run on the main thread, since it relies on SIGXCPU.
+    """
+    if seconds is None or resource is None or not hasattr(signal, "SIGXCPU"):
+        yield
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = usage.ru_utime + usage.ru_stime
+    soft, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    limit = int(used + seconds) + 1
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    previous = signal.signal(signal.SIGXCPU, _raise_cpu_limit)
+    resource.setrlimit(resource.RLIMIT_CPU, (limit, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+        signal.signal(signal.SIGXCPU, previous)
+
+
+def classify_error(error: BaseException | None) -> str | None:
+    """Map an exception from REPL code to a limit name, if it hit one."""
+    if isinstance(error, MemoryError):
+        return "memory_limit"
+    if isinstance(error, CPULimitExceeded):
+        return "cpu_limit"
+    if isinstance(error, (ReplTimeout, KeyboardInterrupt)):
+        return "timeout"
+    return None
+
+
+def limit_message(
+    kind: str, timeout: float | None = None, state_lost: bool = False, abandoned: bool = False
+) -> str:
+    """Explain to the model which limit stopped its code and what survived."""
+    if kind == "timeout":
+        message = f"Execution timed out after {timeout or 0:g}s and was interrupted."
+    elif kind == "memory_limit":
+        message = "Memory limit exceeded (MemoryError); the execution was stopped."
+    else:
+        message = "CPU time limit exceeded; the execution was stopped."
+    if state_lost:
+        message += " The REPL had to be restarted and its state was lost, except pre-loaded variables."
+    elif abandoned:
+        message += (
+            " The code did not respond to the interrupt and may still be running in the"
+            " background; REPL variables it touches can still change."
+        )
+    else:
+        message += " REPL state is preserved, including variables assigned before the interruption."
+    return message + " Switch to a cheaper strategy, e.g. process less data per call or use the index tools."
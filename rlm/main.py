@@ -1,22 +1,32 @@
 import argparse
+import asyncio
+import dataclasses
 import json
-from code import InteractiveConsole
+from concurrent.futures import ThreadPoolExecutor
 import contextlib
-from dataclasses import dataclass
-import io
+import contextvars
+from dataclasses import dataclass, field
+import functools
 import os
+import pickle
+import reprlib
 import sys
 import textwrap
+import threading
+import time
 import traceback
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Callable, Coroutine, Dict, Iterable, Iterator, TextIO, TypeVar
 
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
+from anthropic.lib.streaming import ParsedMessageStreamEvent
 from anthropic.types import (
+    Message,
     MessageParam,
     TextBlockParam,
     ToolResultBlockParam,
     ToolUnionParam,
+    ToolUseBlock,
 )
 from dotenv import load_dotenv
 
@@ -24,6 +34,40 @@ from dotenv import load_dotenv
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import agent_tools
+from rlm.client import configure_client, get_client_manager
+from rlm.batch import BatchReport, BatchTask, Checkpoint, load_tasks, run_batch
+from rlm.budget import BudgetLimits, PartialResult, current_budget, start_budget
+from rlm.capture import OUTPUT_HEAD_CHARS, OUTPUT_TAIL_CHARS, BoundedOutput
+from rlm.context import FileContext
+from rlm.limits import (
+    ReplConsole,
+    ReplDeadline,
+    ReplTimeout,
+    classify_error,
+    clear_interrupt,
+    deadline_paused,
+    interrupt_thread,
+    limit_message,
+    set_current_deadline,
+)
+from rlm.compaction import COMPACTION_MODES, compact_conversation, estimate_tokens
+from rlm.cache import CACHE_MODES, configure_cache, get_cache, request_key
+from rlm.metrics import LLMCallMetric, ReplExecMetric, get_metrics
+from rlm.memo import configure_memo, get_memo, memo_key
+from rlm.replay import LogReplay, OfflineClient
+from rlm.routing import DEFAULT_MAX_DEPTH, ModelRoute, RoutingPolicy
+from rlm.session import (
+    AgentCheckpoint,
+    SessionStore,
+    configure_sessions,
+    current_checkpoint,
+    enter_checkpoint,
+    get_session_store,
+    new_agent_id,
+    snapshot_namespace,
+)
+from rlm.workers import REPL_BACKENDS, WorkerProcess, configure_workers, get_worker_pool
+from rlm.tracing import RUN_ID, configure_tracing, current_span, get_trace_writer, log_event, start_span
 
 
 # JSONL logging setup
@@ -36,12 +80,14 @@ def get_log_file_path() -> str:
 
 
 LOG_FILE_PATH = get_log_file_path()
+configure_tracing(LOG_FILE_PATH)
+# Agent checkpoints of each run, in <SESSIONS_DIR>/<run id>/
+SESSIONS_DIR = os.path.join(os.path.dirname(LOG_FILE_PATH), "sessions")
 
 
 def log_to_jsonl(data: Dict[str, Any]):
-    """Append a JSONL log entry to the log file."""
-    with open(LOG_FILE_PATH, "a", encoding="utf-8") as f:
-        f.write(json.dumps(data, ensure_ascii=False) + "\n")
+    """Queue a JSONL log entry, tagged with the current agent span."""
+    log_event(data)
 
 
 DEFAULT_SYSTEM_PROMPT = textwrap.dedent("""You are an iterative tool-using agent. Your job is to answer the user's query by interacting with a persistent Python REPL via a tool, and only then produce a final answer.
@@ -49,11 +95,17 @@ DEFAULT_SYSTEM_PROMPT = textwrap.dedent("""You are an iterative tool-using agent
 Environment and tool:
 
 * The environment contains a **persistent** Python REPL (state is preserved across calls).
-* You have one tool: `run_python(code: str)` which executes Python code and returns captured `stdout` and `stderr`.
+* Your main tool is `run_python(code: str)` which executes Python code and returns captured `stdout` and `stderr`. The other tools offered to you can be called directly; independent tool calls made in the same turn run concurrently.
 * A variable named `context` is **pre-loaded** in the REPL. This variable contains the task/query to solve. Access it directly with `print(context)` or process it in your Python code.
 * **If `context` is too long to read completely**, use Python code to process it (e.g., `print(context[:200])`, `print(len(context))`, `print(context.split('\n')[0])`, etc.). **Never try to handle long context manually** - always use code.
-* A function named `get_tools` is **pre-loaded** in the REPL. Call `get_tools()` to retrieve the list of available tools. **Always call `get_tools()` first when starting a new task**, and use the returned tools to accomplish your goal when possible.
+* The same tools are available in the REPL through the **pre-loaded** `get_tools()`, which returns them as dicts; call one with `tool["function"](**kwargs)`. Use this when a tool has to be called many times from code.
+* The `search_context`, `grep_context` and `context_lines` tools search `context` through an index that is built once and reused, so **prefer them over scanning `context` yourself**.
 * A function named `agent` is **pre-loaded** in the REPL. You can call `agent(new_context)` or `agent(new_context, custom_system_prompt)` to recursively invoke the agent with a new context/tasks. It will return the final answer from the sub-agent. **Use this when you encounter a gap that cannot be resolved by deterministic code logic.**
+* A function named `agent_map` is **pre-loaded** in the REPL. `agent_map(contexts, system_prompt=None, max_concurrency=8)` runs one sub-agent per item of `contexts` **concurrently** and returns their answers as a list in input order. A failed sub-agent puts its exception object in its slot instead of aborting the batch, so check results with `isinstance(r, Exception)`. **Always prefer `agent_map` over calling `agent()` in a loop** when the sub-tasks are independent (e.g. chunks of a long `context`).
+* A function named `agent_batch` is **pre-loaded** in the REPL. `agent_batch(tasks, max_concurrency=8)` works like `agent_map`, but each task may be a `(context, system_prompt)` tuple so every sub-agent can get its own instructions.
+* `agent`, `agent_map`, `agent_batch` and `agent_reduce` accept `tier="fast"` to run sub-agents on a faster, cheaper model. Use it for simple, well-defined sub-tasks such as extracting, classifying or summarizing one chunk, and keep the default for sub-tasks that need careful reasoning. Recursion depth is limited; past the limit `agent()` raises `RecursionError`, so finish the work with code.
+* Every agent has a budget of iterations, tokens and time that it shares with its sub-agents. A sub-agent that runs out returns a `PartialResult` with `.reason` and `.partial` (its last output) instead of an answer; check for it and finish the work yourself.
+* A function named `agent_reduce` is **pre-loaded** in the REPL. `agent_reduce(items, instruction, fan_in=8)` merges many partial results hierarchically: groups of `fan_in` items are combined by concurrent sub-agents following `instruction`, level by level, until a single answer remains. Use it after `agent_map` when the partial results are too many or too long to combine in one step.
 
 Core rules (must follow):
 
@@ -83,7 +135,14 @@ Finishing:
 """)
 
 
-# Discover and register tools from tools/ directory
+DEFAULT_MODEL = "MiniMax-M2.7"
+DEFAULT_MAX_TOKENS = 2000
+
+WRAP_UP_PROMPT = "Your {reason} budget is almost used up. Wrap up now: in your next step, call FINAL(...) with the best answer you have so far, even if it is incomplete."
+
+COMPACTION_SUMMARY_PROMPT = "You condense tool outputs from an agent session. Summarize the outputs below, keeping every fact, number, name and error that later steps may need. Be concise and do not add commentary."
+
+# Find tool modules in the tools/ directory; they are imported on first use
 agent_tools.discover_tools()
 
 TOOLS: list[ToolUnionParam] = [
@@ -105,10 +164,154 @@ TOOLS: list[ToolUnionParam] = [
 ]
 
 
+def _request_tools() -> list[ToolUnionParam]:
+    """run_python followed by the registry tools, which the model calls directly."""
+    names = {tool["name"] for tool in TOOLS}
+    registry_tools: list[Any] = [
+        tool for tool in agent_tools.get_tool_params() if tool["name"] not in names
+    ]
+    return TOOLS + registry_tools
+
+
+@dataclass(frozen=True)
+class AgentSettings:
+    """Per-agent options. Sub-agents inherit the settings of their parent."""
+
+    # Mark system prompt, tools and conversation prefix as cacheable
+    prompt_caching: bool = True
+    # Estimated request size in tokens above which old tool results are compacted
+    compaction_budget: int | None = 100_000
+    # Number of newest tool results that are never compacted
+    compaction_keep_recent: int = 4
+    # "stub" drops old outputs, "summary" also asks the model to summarize them
+    compaction_mode: str = "stub"
+    # "inprocess" runs REPL code in this process, "subprocess" in a pooled worker
+    repl_backend: str = "inprocess"
+    # Wall-clock limit in seconds for one run_python execution (None disables)
+    repl_timeout: float | None = 300.0
+    # Characters of stdout/stderr kept from the start and end of each execution
+    output_head_chars: int = OUTPUT_HEAD_CHARS
+    output_tail_chars: int = OUTPUT_TAIL_CHARS
+    # Iteration, token and time limits; sub-agents are also bound by their ancestors'
+    budget: BudgetLimits = BudgetLimits()
+    # Model, max_tokens and thinking by recursion depth or tier hint
+    routing: RoutingPolicy = field(
+        default_factory=lambda: RoutingPolicy.single(DEFAULT_MODEL, DEFAULT_MAX_TOKENS)
+    )
+    # Stream responses, printing deltas and starting tool calls as they complete
+    streaming: bool = False
+
+
+_agent_settings: contextvars.ContextVar[AgentSettings] = contextvars.ContextVar(
+    "rlm_agent_settings", default=AgentSettings()
+)
+
+_CACHE_CONTROL: dict[str, Any] = {"type": "ephemeral"}
+
+
+def _with_cache_breakpoints(
+    system_prompt: str, tools: list[ToolUnionParam], conversation: list[MessageParam]
+) -> dict[str, Any]:
+    """Build request fields with prompt cache breakpoints.
+
+    Breakpoints go on the system prompt, the last tool and the last block of
+    the newest message, so each turn reads the previous turn's prefix from
+    the cache and only pays full price for the new suffix. The conversation
+    itself is left untouched.
+    """
+    system = [
+        TextBlockParam(type="text", text=system_prompt, cache_control=_CACHE_CONTROL)
+    ]
+    cached_tools: list[Any] = list(tools)
+    if cached_tools:
+        cached_tools[-1] = {**cached_tools[-1], "cache_control": _CACHE_CONTROL}
+    messages: list[Any] = list(conversation)
+    if messages:
+        last = messages[-1]
+        content = last["content"]
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        blocks: list[Any] = list(content)
+        if blocks:
+            final = blocks[-1]
+            if not isinstance(final, dict):
+                final = final.model_dump(exclude_none=True)
+            if final.get("type") not in ("thinking", "redacted_thinking"):
+                blocks[-1] = {**final, "cache_control": _CACHE_CONTROL}
+                messages[-1] = {**last, "content": blocks}
+    return {"system": system, "tools": cached_tools, "messages": messages}
+
+
+class _ThreadLocalStream:
+    """Proxy for sys.stdout/sys.stderr that routes writes to a per-thread target.
+
+    `contextlib.redirect_stdout` swaps the process-wide stream, so concurrent
+    REPL executions would capture each other's output. Installing this proxy
+    once lets every thread redirect only its own writes.
+    """
+
+    def __init__(self, default: TextIO):
+        self._default = default
+        self._local = threading.local()
+
+    def _target(self) -> TextIO:
+        return getattr(self._local, "target", None) or self._default
+
+    def write(self, s: str) -> int:
+        return self._target().write(s)
+
+    def flush(self) -> None:
+        self._target().flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target(), name)
+
+    @contextlib.contextmanager
+    def redirect(self, target: TextIO) -> Iterator[None]:
+        previous = getattr(self._local, "target", None)
+        self._local.target = target
+        try:
+            yield
+        finally:
+            self._local.target = previous
+
+
+_stream_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _redirect_output(out: TextIO, err: TextIO) -> Iterator[None]:
+    """Redirect stdout and stderr of the current thread only."""
+    with _stream_lock:
+        if not isinstance(sys.stdout, _ThreadLocalStream):
+            sys.stdout = _ThreadLocalStream(sys.stdout)
+        if not isinstance(sys.stderr, _ThreadLocalStream):
+            sys.stderr = _ThreadLocalStream(sys.stderr)
+        stdout, stderr = sys.stdout, sys.stderr
+    with stdout.redirect(out), stderr.redirect(err):
+        yield
+
+
+# Seconds that interrupted REPL code gets to unwind before it is given up on
+REPL_INTERRUPT_GRACE = 5.0
+
+
 class ReplInstance:
-    def __init__(self):
+    def __init__(
+        self, output_head: int = OUTPUT_HEAD_CHARS, output_tail: int = OUTPUT_TAIL_CHARS
+    ):
+        self.output_head = output_head
+        self.output_tail = output_tail
         self.locals: dict[str, object] = {"__name__": "__console__", "__doc__": None}
-        self.ic = InteractiveConsole(self.locals)
+        self.ic = ReplConsole(self.locals)
+        # Dedicated thread so REPL code never blocks the event loop, and a REPL
+        # waiting on its sub-agents cannot starve other REPLs of workers
+        self._executor: ThreadPoolExecutor | None = None
+        # Thread currently executing code, the target of timeout interrupts
+        self._running_thread: int | None = None
+        self._running_lock = threading.Lock()
+        # Output streams of the current execution, read back if it is abandoned
+        self._capture: tuple[BoundedOutput, BoundedOutput] | None = None
         # Add FINAL function to REPL locals
         self.final_result = None
 
@@ -126,60 +329,819 @@ class ReplInstance:
     class RunResult:
         out: str
         err: str
+        # Limit that stopped the code ("timeout", "memory_limit", "cpu_limit")
+        error: str | None = None
+        error_message: str = ""
+        # Characters written before truncation
+        out_chars: int = 0
+        err_chars: int = 0
+
+        @classmethod
+        def captured(
+            cls,
+            out: BoundedOutput,
+            err: BoundedOutput,
+            error: str | None = None,
+            error_message: str = "",
+        ) -> "ReplInstance.RunResult":
+            return cls(out.getvalue(), err.getvalue(), error, error_message, out.total, err.total)
+
+    def run(self, code: str, deadline: ReplDeadline | None = None):
+        out = BoundedOutput(self.output_head, self.output_tail)
+        err = BoundedOutput(self.output_head, self.output_tail)
+        self._capture = (out, err)
+        set_current_deadline(deadline)
+        self.ic.last_error = None
+        with self._running_lock:
+            self._running_thread = threading.get_ident()
+        try:
+            with _redirect_output(out, err):
+                try:
+                    self.ic.runsource(
+                        code, "<console>", "exec"
+                    )  # True means more input required
+                except SystemExit:
+                    print("SystemExit: exit()/quit() is not allowed in this REPL session.")
+                except ReplTimeout as e:
+                    # Interrupt delivered outside of user code
+                    self.ic.last_error = e
+                except Exception:
+                    print(traceback.format_exc())
+        finally:
+            with self._running_lock:
+                self._running_thread = None
+                # Drop an interrupt that arrived too late to be delivered
+                clear_interrupt(threading.get_ident())
+        error = classify_error(self.ic.last_error)
+        return self.RunResult.captured(
+            out,
+            err,
+            error,
+            limit_message(error) if error is not None and error != "timeout" else "",
+        )
 
-    def run(self, code: str):
-        out = io.StringIO()
-        err = io.StringIO()
-        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+    async def _submit(self, func: Any) -> "ReplInstance.RunResult":
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="rlm-repl"
+            )
+        # Copy the context so sub-agents started from REPL code find the running loop
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(ctx.run, func)
+        )
+
+    async def run_async(
+        self, code: str, timeout: float | None = None
+    ) -> "ReplInstance.RunResult":
+        """Run `code` on this REPL's worker thread without blocking the event loop.
+
+        After `timeout` seconds a ReplTimeout is raised inside the running code;
+        time spent waiting on sub-agents does not count. Code stuck in a long C
+        call cannot be interrupted; it is left running on its thread and the
+        REPL continues on a fresh one.
+        """
+        deadline = ReplDeadline(timeout) if timeout is not None else None
+        future = asyncio.ensure_future(self._submit(functools.partial(self.run, code, deadline)))
+        if deadline is None:
+            return await future
+        while (remaining := deadline.remaining()) > 0:
             try:
-                self.ic.runsource(
-                    code, "<console>", "exec"
-                )  # True means more input required
-            except SystemExit:
-                print("SystemExit: exit()/quit() is not allowed in this REPL session.")
-            except Exception:
-                print(traceback.format_exc())
-        return self.RunResult(out.getvalue(), err.getvalue())
-
-
-def agent(context: Any, system_prompt: str = DEFAULT_SYSTEM_PROMPT):
-    ic = ReplInstance()
+                return await asyncio.wait_for(asyncio.shield(future), remaining)
+            except TimeoutError:
+                pass
+        with self._running_lock:
+            if self._running_thread is not None:
+                interrupt_thread(self._running_thread, ReplTimeout)
+        abandoned = False
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), REPL_INTERRUPT_GRACE)
+        except TimeoutError:
+            abandoned = True
+            # Report what the stuck code printed so far
+            result = (
+                self.RunResult.captured(*self._capture)
+                if self._capture is not None
+                else self.RunResult("", "")
+            )
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        except ReplTimeout:
+            result = self.RunResult("", "")
+        result.error = "timeout"
+        result.error_message = limit_message("timeout", timeout, abandoned=abandoned)
+        return result
+
+    def snapshot(self) -> tuple[dict[str, bytes], dict[str, str], list[str]]:
+        """Pickle the REPL variables for a checkpoint (see `snapshot_namespace`)."""
+        return snapshot_namespace(self.locals)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class SubprocessRepl(ReplInstance):
+    """REPL whose code runs in a worker process taken from the worker pool.
+
+    `locals` is a plain dict in the parent; assignments are shipped to the
+    worker before each run. Callables such as `agent` become proxies in the
+    worker that call back into this process, while FINAL and get_tools run
+    in the worker itself. If the worker dies, the error is reported as the
+    run's stderr and the next run starts a fresh worker with the same locals.
+    """
+
+    def __init__(
+        self, output_head: int = OUTPUT_HEAD_CHARS, output_tail: int = OUTPUT_TAIL_CHARS
+    ):
+        self.output_head = output_head
+        self.output_tail = output_tail
+        self.locals: dict[str, object] = {}
+        self._executor: ThreadPoolExecutor | None = None
+        self.final_result = None
+        self._worker: WorkerProcess | None = None
+        # id() of each value as last sent to the worker
+        self._synced: dict[str, int] = {}
+
+    def _ensure_worker(self) -> WorkerProcess:
+        if self._worker is None:
+            self._worker = get_worker_pool().acquire()
+            self._synced.clear()
+        return self._worker
+
+    def _sync_locals(self, worker: WorkerProcess) -> None:
+        for name, value in list(self.locals.items()):
+            if self._synced.get(name) == id(value):
+                continue
+            if callable(value):
+                worker.send(("proxy", name))
+            else:
+                worker.send(("set", name, value))
+            self._synced[name] = id(value)
+
+    async def run_async(
+        self, code: str, timeout: float | None = None
+    ) -> "ReplInstance.RunResult":
+        """Run `code` in the worker; on timeout the worker is interrupted with SIGINT."""
+        return await self._submit(functools.partial(self.run, code, timeout))
+
+    def _handle_call(self, worker: WorkerProcess, name: str, args: Any, kwargs: Any) -> None:
+        func = self.locals.get(name)
+        try:
+            if not callable(func):
+                raise NameError(f"{name} is not callable in the parent process")
+            reply: tuple[str, Any] = ("return", func(*args, **kwargs))
+        except Exception as e:
+            reply = ("error", e)
+        try:
+            worker.send(reply)
+        except Exception as e:
+            # Value or exception could not be pickled
+            worker.send(("error", RuntimeError(f"{name}() result could not be sent to the REPL worker: {e}")))
+
+    def run(self, code: str, timeout: float | None = None):
+        try:
+            worker = self._ensure_worker()
+            self._sync_locals(worker)
+            worker.send(("run", code, self.output_head, self.output_tail))
+            # Paused while a call back into this process waits on sub-agents
+            deadline = ReplDeadline(timeout) if timeout is not None else None
+            set_current_deadline(deadline)
+            interrupted = False
+            grace_until = 0.0
+            while True:
+                if deadline is not None:
+                    if interrupted:
+                        remaining = grace_until - time.monotonic()
+                    else:
+                        remaining = deadline.remaining()
+                    if remaining <= 0 and not interrupted:
+                        worker.interrupt()
+                        interrupted = True
+                        grace_until = time.monotonic() + REPL_INTERRUPT_GRACE
+                        continue
+                    if remaining <= 0:
+                        # Interrupt was ignored, e.g. inside a long C call
+                        self._discard_worker()
+                        return self.RunResult(
+                            "",
+                            "",
+                            "timeout",
+                            limit_message("timeout", timeout, state_lost=True),
+                        )
+                    if not worker.poll(remaining):
+                        continue
+                message = worker.recv()
+                if message[0] == "call":
+                    _, name, args, kwargs = message
+                    self._handle_call(worker, name, args, kwargs)
+                elif message[0] == "done":
+                    _, out, err, out_chars, err_chars, has_final, final, error = message
+                    if has_final:
+                        self.final_result = final
+                    if interrupted:
+                        error = "timeout"
+                    return self.RunResult(
+                        out,
+                        err,
+                        error,
+                        limit_message(error, timeout) if error is not None else "",
+                        out_chars,
+                        err_chars,
+                    )
+        except (EOFError, OSError):
+            exitcode = self._worker.exitcode if self._worker is not None else None
+            self._discard_worker()
+            return self.RunResult(
+                "",
+                f"REPL worker process died (exit code {exitcode}). All REPL state except pre-loaded variables was lost.\n",
+            )
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            return self.RunResult("", f"Could not send data to the REPL worker: {e}\n")
+
+    def snapshot(self) -> tuple[dict[str, bytes], dict[str, str], list[str]]:
+        """Pickle the variables of the worker, which holds the live REPL state."""
+        if self._worker is None:
+            return snapshot_namespace(self.locals)
+        try:
+            self._worker.send(("snapshot",))
+            _, variables, modules, unsaved = self._worker.recv()
+        except (EOFError, OSError):
+            self._discard_worker()
+            return snapshot_namespace(self.locals)
+        return variables, modules, unsaved
+
+    def _discard_worker(self) -> None:
+        if self._worker is not None:
+            self._worker.close()
+            self._worker = None
+
+    def close(self) -> None:
+        super().close()
+        self._discard_worker()
+
+
+# Event loop driving the current agent tree, visible to REPL threads via contextvars
+_agent_loop: contextvars.ContextVar[asyncio.AbstractEventLoop | None] = (
+    contextvars.ContextVar("rlm_agent_loop", default=None)
+)
+
+_T = TypeVar("_T")
+
+
+def _run_sync(coro: Coroutine[Any, Any, _T]) -> _T:
+    """Run `coro` to completion from synchronous code.
+
+    Inside REPL code the coroutine is scheduled on the loop of the calling
+    agent, so recursive sub-agents share one event loop; elsewhere a fresh
+    loop is started.
+    """
+    loop = _agent_loop.get()
+    if loop is not None and loop.is_running():
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        # Sub-agents have budgets of their own; waiting on them is not REPL time
+        with deadline_paused():
+            try:
+                return future.result()
+            except BaseException:
+                # Interrupted, e.g. by a REPL timeout: stop the sub-agents too
+                future.cancel()
+                raise
+    return asyncio.run(_with_client(coro))
+
+
+async def _with_client(coro: Coroutine[Any, Any, _T]) -> _T:
+    """Await `coro`, then close the API client of the loop it ran on."""
+    try:
+        return await coro
+    finally:
+        await get_client_manager().release()
+
+
+_context_repr = reprlib.Repr(maxstring=100, maxother=100, maxlist=10, maxdict=10)
+
+
+def _context_head(context: Any, n: int = 100) -> str:
+    """Return the first `n` characters of `context` without copying all of it."""
+    if isinstance(context, str):
+        return context[:n]
+    head = getattr(context, "head", None)
+    if callable(head):
+        return str(head(n))[:n]
+    return _context_repr.repr(context)[:n]
+
+
+def _initial_prompt(context: Any, task: str | None) -> str:
+    text = f"Solve the problem in context variable in REPL environment, type of context is {type(context)}, head of context is {_context_head(context)}."
+    usage_hint = getattr(context, "usage_hint", None)
+    if usage_hint:
+        text += f"\n{usage_hint}"
+    if task:
+        text += f"\nTask: {task}"
+    return text
+
+
+async def agent_async(
+    context: Any,
+    system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+    settings: AgentSettings | None = None,
+    task: str | None = None,
+    tier: str | None = None,
+) -> Any:
+    """Run an agent, reusing the result of an identical earlier or in-flight call.
+
+    `settings` defaults to the settings of the calling agent, if any. `task`
+    is an optional instruction shown next to the context, for contexts such
+    as files that do not state the question themselves. `tier` asks the
+    routing policy for a specific model tier instead of the one for the
+    agent's depth.
+    """
+    token = _agent_settings.set(settings) if settings is not None else None
+    try:
+        # Allocated before the memo lookup so IDs do not depend on cache hits
+        agent_id = new_agent_id()
+        parent = current_span()
+        depth = parent.depth + 1 if parent else 0
+        routing = _agent_settings.get().routing
+        routing.check_depth(depth)
+        tier, route = routing.route(depth, tier)
+        key = memo_key(context, system_prompt, task, route.request_fields())
+        result, source = await get_memo().run(
+            key,
+            # A task of its own runs the agent in a copy of this context, so the
+            # span, budget and checkpoint it sets do not leak into the caller
+            lambda: asyncio.create_task(
+                _agent_uncached(context, system_prompt, task, tier, route, agent_id)
+            ),
+            # Results cut short by a budget depend on the budget, not just the inputs
+            cacheable=lambda r: not isinstance(r, PartialResult),
+        )
+    finally:
+        if token is not None:
+            _agent_settings.reset(token)
+    if source is not None:
+        # Log memoized sub-agent result
+        log_to_jsonl(
+            {
+                "type": "agent_cache_hit",
+                "source": source,
+                "key": key,
+                "context_head": _context_head(context),
+                "result": result,
+            }
+        )
+    return result
+
+
+async def _restore_repl(
+    ic: ReplInstance, checkpoint: AgentCheckpoint, timeout: float | None
+) -> str:
+    """Bring a fresh REPL to the state saved in `checkpoint`.
+
+    Saved variables are loaded when all of them could be pickled; otherwise
+    the agent's code is executed again in order, with its sub-agents
+    returning their saved results. Returns "restored" or "replayed".
+    """
+    if not checkpoint.unsaved:
+        try:
+            ic.locals.update(checkpoint.load_variables())
+        except Exception as e:
+            print(f"Warning: could not load REPL variables of agent {checkpoint.agent_id} ({e}); re-executing its code")
+        else:
+            if checkpoint.modules:
+                await ic.run_async(checkpoint.import_code(), timeout)
+            return "restored"
+    # Replayed agent() calls must get the same IDs as the first time
+    children = checkpoint.children
+    checkpoint.children = 0
+    for code in checkpoint.history:
+        await ic.run_async(code, timeout)
+    checkpoint.children = children
+    ic.final_result = None
+    return "replayed"
+
+
+async def _agent_uncached(
+    context: Any,
+    system_prompt: str,
+    task: str | None,
+    tier: str,
+    route: ModelRoute,
+    agent_id: str,
+) -> Any:
+    _agent_loop.set(asyncio.get_running_loop())
+    # Context-aware tools called from the REPL default to this agent's context
+    agent_tools.set_active_context(context)
+    span = start_span()
+    store = get_session_store()
+    saved = store.load(agent_id)
+    if saved is not None and saved.status == "done":
+        log_to_jsonl(
+            {"type": "agent_resumed", "agent_id": agent_id, "status": "done", "result": saved.result}
+        )
+        return saved.result
+    parent = current_checkpoint()
+    checkpoint = saved or AgentCheckpoint(
+        agent_id, parent.agent_id if parent else None, span.depth
+    )
+    enter_checkpoint(checkpoint)
+    settings = _agent_settings.get()
+    budget = start_budget(settings.budget)
+    repl_cls = SubprocessRepl if settings.repl_backend == "subprocess" else ReplInstance
+    ic = repl_cls(settings.output_head_chars, settings.output_tail_chars)
     ic.locals["context"] = context
     ic.locals["agent"] = agent
-    conversation: list[MessageParam] = [
-        {
-            "role": "user",
-            "content": [
+    ic.locals["agent_map"] = agent_map
+    ic.locals["agent_batch"] = agent_batch
+    ic.locals["agent_reduce"] = agent_reduce
+    try:
+        if saved is None:
+            conversation: list[MessageParam] = [
                 {
-                    "type": "text",
-                    "text": f"Solve the problem in context variable in REPL environment, type of context is {type(context)}, head of context is {str(context)[:100]}.",
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": _initial_prompt(context, task),
+                        }
+                    ],
                 }
-            ],
-        }
-    ]
-    # Log initial user message
-    log_to_jsonl({"type": "user_message", "content": conversation[0]["content"]})
-    client = Anthropic()
-    retry_times = 5
-    while True:
-        message = client.messages.create(
-            model="MiniMax-M2.7",
-            max_tokens=2000,
-            system=system_prompt,
-            tools=TOOLS,
-            messages=conversation,
+            ]
+            # Log initial user message
+            log_to_jsonl(
+                {
+                    "type": "user_message",
+                    "content": conversation[0]["content"],
+                    "tier": tier,
+                    "model": route.model,
+                    "agent_id": agent_id,
+                }
+            )
+        else:
+            conversation = saved.conversation
+            span.iteration = saved.iteration
+            budget.restore(saved.usage)
+            mode = await _restore_repl(ic, saved, settings.repl_timeout)
+            print(f"Resuming agent {agent_id} at iteration {saved.iteration} ({mode} REPL state)")
+            log_to_jsonl(
+                {
+                    "type": "agent_resumed",
+                    "agent_id": agent_id,
+                    "status": "running",
+                    "mode": mode,
+                    "resumed_run": store.run_id,
+                    "usage": saved.usage,
+                }
+            )
+        return await _run_agent_loop(ic, conversation, system_prompt, route, checkpoint)
+    finally:
+        ic.close()
+
+
+class _StreamPrinter:
+    """Prints a streamed response and reports each completed tool_use block.
+
+    Output matches the block-by-block printing of the non-streaming path. Only
+    the root agent prints deltas as they arrive; concurrent sub-agents would
+    interleave them, so they print each block once it is complete.
+    """
+
+    def __init__(self, on_tool_use: Callable[[ToolUseBlock], None]):
+        self.on_tool_use = on_tool_use
+        # Once a tool call has started, the request can no longer be retried
+        self.tool_calls = 0
+        span = current_span()
+        self.live = span is None or span.depth == 0
+
+    def handle(self, event: ParsedMessageStreamEvent) -> None:
+        if event.type == "content_block_start" and self.live:
+            if event.content_block.type == "thinking":
+                print("Thinking:", flush=True)
+            elif event.content_block.type == "text":
+                print("Text:", flush=True)
+        elif event.type == "thinking" and self.live:
+            print(event.thinking, end="", flush=True)
+        elif event.type == "text" and self.live:
+            print(event.text, end="", flush=True)
+        elif event.type == "content_block_stop":
+            block = event.content_block
+            if block.type == "tool_use":
+                self.tool_calls += 1
+                self.on_tool_use(block)
+            elif block.type in ("thinking", "text"):
+                if self.live:
+                    print("\n")
+                elif block.type == "thinking":
+                    print(f"Thinking:\n{block.thinking}\n")
+                else:
+                    print(f"Text:\n{block.text}\n")
+
+
+async def _stream_message(
+    client: AsyncAnthropic, printer: _StreamPrinter, request: dict[str, Any]
+) -> Message:
+    async with client.messages.stream(**request) as stream:
+        async for event in stream:
+            printer.handle(event)
+        final = await stream.get_final_message()
+    # Drop the parsing fields of the stream helpers so the message is
+    # identical to a messages.create response
+    return Message.model_validate(
+        final.model_dump(mode="json", exclude={"content": {"__all__": {"parsed_output"}}})
+    )
+
+
+async def _create_message(
+    printer: _StreamPrinter | None = None, **request: Any
+) -> tuple[Message, LLMCallMetric]:
+    """Call the Messages API through the response cache and record its metrics.
+
+    Requests go through the shared client manager, which applies rate limits
+    and retries. With a `printer` the response is streamed through it; cached
+    responses are returned without streaming.
+    """
+    cache = get_cache()
+    start = time.perf_counter()
+    message: Message | None = None
+    key = request_key(request) if cache.mode != "off" else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            message = Message.model_validate(cached)
+    from_cache = message is not None
+    retries = 0
+    if message is None:
+        tokens = estimate_tokens(request.get("system"), request.get("tools"), request["messages"])
+        if printer is not None:
+            stream_printer = printer
+            message, retries = await get_client_manager().call(
+                lambda client: _stream_message(client, stream_printer, request),
+                tokens,
+                can_retry=lambda: stream_printer.tool_calls == 0,
+            )
+        else:
+            message, retries = await get_client_manager().call(
+                lambda client: client.messages.create(**request), tokens
+            )
+        if key is not None:
+            cache.put(key, message.model_dump(mode="json"))
+    span = current_span()
+    usage = message.usage
+    metric = LLMCallMetric(
+        span_id=span.span_id if span else None,
+        depth=span.depth if span else 0,
+        latency=time.perf_counter() - start,
+        input_tokens=usage.input_tokens,
+        output_tokens=usage.output_tokens,
+        cache_read_tokens=usage.cache_read_input_tokens or 0,
+        cache_write_tokens=usage.cache_creation_input_tokens or 0,
+        stop_reason=message.stop_reason,
+        cached=from_cache,
+        retries=retries,
+    )
+    get_metrics().record_llm_call(metric)
+    return message, metric
+
+
+async def _run_agent_loop(
+    ic: ReplInstance,
+    conversation: list[MessageParam],
+    system_prompt: str,
+    route: ModelRoute,
+    checkpoint: AgentCheckpoint,
+) -> Any:
+    settings = _agent_settings.get()
+    tools = _request_tools()
+    overhead_tokens = estimate_tokens(system_prompt, tools)
+
+    async def summarize(outputs: list[str]) -> str:
+        text = "\n\n---\n\n".join(output[:4000] for output in outputs)
+        message, _ = await _create_message(
+            model=route.model,
+            max_tokens=route.max_tokens,
+            system=COMPACTION_SUMMARY_PROMPT,
+            messages=[{"role": "user", "content": text[:40000]}],
         )
-        # Log assistant message
+        budget.charge(message.usage.input_tokens, message.usage.output_tokens)
+        return "".join(block.text for block in message.content if block.type == "text")
+
+    span = current_span()
+    budget = current_budget()
+    assert budget is not None
+    # Last text or REPL output, returned if the agent stops before FINAL
+    last_output = str(checkpoint.loop_state.get("last_output", ""))
+    store = get_session_store()
+    # Code run in the current iteration, added to the checkpoint when it ends
+    executed: list[str] = []
+
+    async def save_checkpoint(snapshot: bool) -> None:
+        """Save the agent; `snapshot` also saves the REPL state, once no code runs."""
+        if not store.enabled:
+            return
+        if snapshot:
+            (
+                checkpoint.variables,
+                checkpoint.modules,
+                checkpoint.unsaved,
+            ) = await ic._submit(ic.snapshot)
+            checkpoint.history.extend(executed)
+            executed.clear()
+        checkpoint.conversation = conversation
+        checkpoint.iteration = span.iteration if span else 0
+        checkpoint.usage = budget.usage()
+        checkpoint.loop_state = {
+            "retry_times": retry_times,
+            "wrap_up_sent": wrap_up_sent,
+            "last_output": last_output,
+        }
+        store.save(checkpoint)
+
+    def stop(reason: str) -> PartialResult:
+        result = PartialResult(reason, last_output, budget.usage())
+        with (
+            contextlib.redirect_stdout(sys.stdout),
+            contextlib.redirect_stderr(sys.stderr),
+        ):
+            print(f"Stopping early ({reason}); returning partial result.")
         log_to_jsonl(
             {
-                "type": "assistant_message",
-                "content": [block.model_dump() for block in message.content],
+                "type": "budget_exhausted",
+                "reason": reason,
+                "usage": result.usage,
+                "partial": last_output,
             }
         )
-        conversation.append(MessageParam(role="assistant", content=message.content))
+        return result
+
+    async def execute(
+        block: ToolUseBlock, previous: asyncio.Task[Any] | None
+    ) -> tuple[dict[str, Any], float, int]:
+        """Run run_python code; returns the tool result, latency and output size."""
+        # Tool calls run in order; wait for the previous one before starting
+        if previous is not None:
+            await asyncio.wait([previous])
+        with (
+            contextlib.redirect_stdout(sys.stdout),
+            contextlib.redirect_stderr(sys.stderr),
+        ):
+            print(f"Tool:\n{block}")
+        exec_start = time.perf_counter()
+        timeout = settings.repl_timeout
+        remaining = budget.remaining_seconds()
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        r = await ic.run_async(str(block.input["code"]), timeout=timeout)
+        executed.append(str(block.input["code"]))
+        repl_metric = ReplExecMetric(
+            span_id=span.span_id if span else None,
+            depth=span.depth if span else 0,
+            latency=time.perf_counter() - exec_start,
+            stdout_chars=r.out_chars,
+            stderr_chars=r.err_chars,
+        )
+        get_metrics().record_repl_exec(repl_metric)
+        # Output is already truncated to head and tail during capture
+        result: dict[str, Any] = {"stdout": r.out, "stderr": r.err}
+        if r.error is not None:
+            result["error"] = r.error
+            result["message"] = r.error_message
+        return result, repl_metric.latency, r.out_chars + r.err_chars
+
+    async def call_tool(block: ToolUseBlock) -> tuple[dict[str, Any], float, int]:
+        """Run a registry tool on a worker thread, concurrently with other calls."""
+        with (
+            contextlib.redirect_stdout(sys.stdout),
+            contextlib.redirect_stderr(sys.stderr),
+        ):
+            print(f"Tool:\n{block}")
+        start = time.perf_counter()
+        try:
+            # to_thread copies the context, so tools see this agent's context
+            value = await asyncio.to_thread(agent_tools.call_tool, block.name, dict(block.input))
+        except Exception as e:
+            result: dict[str, Any] = {"error": f"{type(e).__name__}: {e}"}
+            return result, time.perf_counter() - start, len(result["error"])
+        text = json.dumps(value, ensure_ascii=False, default=str)
+        if len(text) > settings.output_head_chars + settings.output_tail_chars:
+            bounded = BoundedOutput(settings.output_head_chars, settings.output_tail_chars)
+            bounded.write(text)
+            result = {"result": bounded.getvalue()}
+        else:
+            result = {"result": value}
+        return result, time.perf_counter() - start, len(text)
+
+    retry_times = int(checkpoint.loop_state.get("retry_times", 5))
+    wrap_up_sent = bool(checkpoint.loop_state.get("wrap_up_sent", False))
+    # A resumed agent that stopped between a model call and its tool results
+    # runs those tool calls before calling the model again
+    pending = conversation[-1]["content"] if conversation[-1]["role"] == "assistant" else None
+    while True:
+        # Tool executions by tool_use id, started early when streaming
+        executions: dict[str, asyncio.Task[Any]] = {}
+        last_execution: asyncio.Task[Any] | None = None
+
+        def start_execution(block: ToolUseBlock) -> asyncio.Task[Any]:
+            nonlocal last_execution
+            if block.name != "run_python":
+                # Registry tools share no REPL state, so they need not wait
+                executions[block.id] = asyncio.create_task(call_tool(block))
+                return executions[block.id]
+            last_execution = asyncio.create_task(execute(block, last_execution))
+            executions[block.id] = last_execution
+            return last_execution
+
+        if pending is None:
+            if span is not None:
+                span.iteration += 1
+            reason = budget.exhausted()
+            if reason is not None:
+                return stop(reason)
+            reason = budget.near_limit()
+            if reason is not None and not wrap_up_sent:
+                wrap_up_sent = True
+                log_to_jsonl({"type": "budget_warning", "reason": reason, "usage": budget.usage()})
+                conversation.append(
+                    MessageParam(
+                        role="user",
+                        content=[
+                            TextBlockParam(
+                                type="text",
+                                text=WRAP_UP_PROMPT.format(reason=reason.replace("_", " ")),
+                            )
+                        ],
+                    )
+                )
+            budget.next_iteration()
+            if settings.compaction_budget is not None:
+                compaction = await compact_conversation(
+                    conversation,
+                    settings.compaction_budget,
+                    keep_recent=settings.compaction_keep_recent,
+                    overhead_tokens=overhead_tokens,
+                    summarize=summarize if settings.compaction_mode == "summary" else None,
+                )
+                if compaction is not None:
+                    # Log compaction event
+                    log_to_jsonl(
+                        {
+                            "type": "compaction",
+                            "mode": settings.compaction_mode,
+                            "before_tokens": compaction.before_tokens,
+                            "after_tokens": compaction.after_tokens,
+                            "compacted_results": compaction.compacted_results,
+                        }
+                    )
+            if settings.prompt_caching:
+                request = _with_cache_breakpoints(system_prompt, tools, conversation)
+            else:
+                request = {"system": system_prompt, "tools": tools, "messages": conversation}
+            printer = _StreamPrinter(start_execution) if settings.streaming else None
+            try:
+                # A wall-clock budget also bounds a call that is already running
+                message, llm_metric = await asyncio.wait_for(
+                    _create_message(printer, **route.request_fields(), **request),
+                    budget.remaining_seconds(),
+                )
+            except BaseException as e:
+                for task in executions.values():
+                    task.cancel()
+                if isinstance(e, TimeoutError):
+                    return stop("time")
+                raise
+            budget.charge(message.usage.input_tokens, message.usage.output_tokens)
+            # Text and thinking were already printed while streaming
+            streamed = printer is not None and not llm_metric.cached
+            # Log assistant message
+            log_to_jsonl(
+                {
+                    "type": "assistant_message",
+                    "content": [block.model_dump() for block in message.content],
+                    "usage": message.usage.model_dump(),
+                    "stop_reason": message.stop_reason,
+                    "latency": llm_metric.latency,
+                }
+            )
+            conversation.append(MessageParam(role="assistant", content=message.content))
+            blocks = message.content
+            await save_checkpoint(snapshot=False)
+        else:
+            blocks, pending = list(pending), None
+            # Text and thinking were printed by the interrupted run
+            streamed = True
+        # Start every tool call of the turn before waiting for any of them
+        for block in blocks:
+            if block.type == "tool_use" and block.id not in executions:
+                start_execution(block)
         has_tool = False
-        for block in message.content:
-            if block.type == "thinking":
+        tool_results: list[ToolResultBlockParam] = []
+        for block in blocks:
+            if block.type == "text" and block.text.strip():
+                last_output = block.text
+            if block.type in ("thinking", "text") and streamed:
+                continue
+            elif block.type == "thinking":
                 with (
                     contextlib.redirect_stdout(sys.stdout),
                     contextlib.redirect_stderr(sys.stderr),
@@ -193,25 +1155,10 @@ def agent(context: Any, system_prompt: str = DEFAULT_SYSTEM_PROMPT):
                     print(f"Text:\n{block.text}\n")
             elif block.type == "tool_use":
                 has_tool = True
-                with (
-                    contextlib.redirect_stdout(sys.stdout),
-                    contextlib.redirect_stderr(sys.stderr),
-                ):
-                    print(f"Tool:\n{block}")
-                r = ic.run(str(block.input["code"]))
-                # Truncate stdout and stderr separately, then return as JSON
-                max_tool_result_length = 2000  # Limit each output length
-                stdout = r.out
-                stderr = r.err
-                if len(stdout) > max_tool_result_length:
-                    stdout = (
-                        stdout[:max_tool_result_length] + "\n... [output truncated]"
-                    )
-                if len(stderr) > max_tool_result_length:
-                    stderr = (
-                        stderr[:max_tool_result_length] + "\n... [output truncated]"
-                    )
-                tool_result_str = json.dumps({"stdout": stdout, "stderr": stderr})
+                result, latency, output_chars = await executions[block.id]
+                if str(result.get("stdout", "")).strip():
+                    last_output = result["stdout"]
+                tool_result_str = json.dumps(result, default=str)
                 with (
                     contextlib.redirect_stdout(sys.stdout),
                     contextlib.redirect_stderr(sys.stderr),
@@ -222,19 +1169,16 @@ def agent(context: Any, system_prompt: str = DEFAULT_SYSTEM_PROMPT):
                     {
                         "type": "tool_result",
                         "tool_use_id": block.id,
-                        "result": {"stdout": stdout, "stderr": stderr},
+                        "result": result,
+                        "latency": latency,
+                        "output_chars": output_chars,
                     }
                 )
-                conversation.append(
-                    MessageParam(
-                        role="user",
-                        content=[
-                            ToolResultBlockParam(
-                                type="tool_result",
-                                tool_use_id=block.id,
-                                content=tool_result_str,
-                            )
-                        ],
+                tool_results.append(
+                    ToolResultBlockParam(
+                        type="tool_result",
+                        tool_use_id=block.id,
+                        content=tool_result_str,
                     )
                 )
             else:
@@ -243,6 +1187,9 @@ def agent(context: Any, system_prompt: str = DEFAULT_SYSTEM_PROMPT):
                     contextlib.redirect_stderr(sys.stderr),
                 ):
                     print(f"Block:\n{block}")
+        if tool_results:
+            # All results of one turn go back in a single message
+            conversation.append(MessageParam(role="user", content=tool_results))
 
         if ic.final_result:
             with (
@@ -252,9 +1199,15 @@ def agent(context: Any, system_prompt: str = DEFAULT_SYSTEM_PROMPT):
                 print(f"FINAL:\n{ic.final_result}")
             # Log final result
             log_to_jsonl({"type": "final_result", "result": ic.final_result})
+            if store.enabled:
+                checkpoint.finish(ic.final_result)
+                store.save(checkpoint)
             return ic.final_result
 
-        if not has_tool and retry_times > 0:
+        if not has_tool:
+            if retry_times == 0:
+                # The model keeps answering without tools; give up instead of looping
+                return stop("no_progress")
             retry_times -= 1
             with (
                 contextlib.redirect_stdout(sys.stdout),
@@ -274,20 +1227,517 @@ Continue from your last step by calling run_python, and when finished, output th
                     ],
                 )
             )
+        await save_checkpoint(snapshot=bool(executed))
+
+
+def agent(
+    context: Any,
+    system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+    settings: AgentSettings | None = None,
+    task: str | None = None,
+    tier: str | None = None,
+) -> Any:
+    """Synchronous wrapper over `agent_async`."""
+    return _run_sync(agent_async(context, system_prompt, settings, task, tier))
+
+
+AGENT_MAP_MAX_CONCURRENCY = 8
+
+
+async def agent_batch_async(
+    tasks: Iterable[Any],
+    max_concurrency: int = AGENT_MAP_MAX_CONCURRENCY,
+    tier: str | None = None,
+) -> list[Any]:
+    """Run one sub-agent per task concurrently and return results in input order.
+
+    A task is either a context or a `(context, system_prompt)` tuple. A failing
+    sub-agent does not abort the batch: its exception is returned in its slot.
+    """
+    calls: list[tuple[Any, str]] = []
+    for task in tasks:
+        if isinstance(task, tuple) and len(task) == 2:
+            context, system_prompt = task
+            calls.append((context, system_prompt or DEFAULT_SYSTEM_PROMPT))
+        else:
+            calls.append((task, DEFAULT_SYSTEM_PROMPT))
+
+    # Each child builds its own ReplInstance inside agent_async(), so they share nothing
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_one(context: Any, prompt: str) -> Any:
+        async with semaphore:
+            return await agent_async(context, prompt, tier=tier)
+
+    return list(
+        await asyncio.gather(
+            *(run_one(context, prompt) for context, prompt in calls),
+            return_exceptions=True,
+        )
+    )
+
+
+async def agent_map_async(
+    contexts: Iterable[Any],
+    system_prompt: str | None = None,
+    max_concurrency: int = AGENT_MAP_MAX_CONCURRENCY,
+    tier: str | None = None,
+) -> list[Any]:
+    """Run `agent_async()` over `contexts` concurrently with a shared system prompt."""
+    return await agent_batch_async(
+        [(context, system_prompt) for context in contexts], max_concurrency, tier
+    )
+
+
+async def agent_reduce_async(
+    items: Iterable[Any],
+    instruction: str,
+    fan_in: int = 8,
+    system_prompt: str | None = None,
+    max_concurrency: int = AGENT_MAP_MAX_CONCURRENCY,
+    tier: str | None = None,
+) -> Any:
+    """Combine `items` hierarchically with sub-agents until one result remains.
+
+    Every level groups `fan_in` consecutive items into one context that starts
+    with `instruction`, and the groups of a level are combined concurrently.
+    """
+    fan_in = max(2, fan_in)
+    level = list(items)
+    if not level:
+        return None
+    while len(level) > 1:
+        groups = [level[i : i + fan_in] for i in range(0, len(level), fan_in)]
+        contexts = [
+            instruction
+            + "\n\n"
+            + "\n\n".join(
+                f"--- Part {i} ---\n{part}" for i, part in enumerate(group, 1)
+            )
+            for group in groups
+        ]
+        results = await agent_map_async(contexts, system_prompt, max_concurrency, tier)
+        level = [
+            f"[sub-agent failed: {r!r}]" if isinstance(r, Exception) else r
+            for r in results
+        ]
+    return level[0]
+
+
+def agent_batch(
+    tasks: Iterable[Any],
+    max_concurrency: int = AGENT_MAP_MAX_CONCURRENCY,
+    tier: str | None = None,
+) -> list[Any]:
+    """Synchronous wrapper over `agent_batch_async`."""
+    return _run_sync(agent_batch_async(tasks, max_concurrency, tier))
+
+
+def agent_map(
+    contexts: Iterable[Any],
+    system_prompt: str | None = None,
+    max_concurrency: int = AGENT_MAP_MAX_CONCURRENCY,
+    tier: str | None = None,
+) -> list[Any]:
+    """Synchronous wrapper over `agent_map_async`."""
+    return _run_sync(agent_map_async(contexts, system_prompt, max_concurrency, tier))
+
+
+def agent_reduce(
+    items: Iterable[Any],
+    instruction: str,
+    fan_in: int = 8,
+    system_prompt: str | None = None,
+    max_concurrency: int = AGENT_MAP_MAX_CONCURRENCY,
+    tier: str | None = None,
+) -> Any:
+    """Synchronous wrapper over `agent_reduce_async`."""
+    return _run_sync(
+        agent_reduce_async(items, instruction, fan_in, system_prompt, max_concurrency, tier)
+    )
+
+
+def _add_agent_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the options shared by single runs and batch runs."""
+    parser.add_argument(
+        "--cache",
+        choices=CACHE_MODES,
+        default="off",
+        help="LLM response cache mode: off, read (read-only) or rw (read-write)",
+    )
+    parser.add_argument(
+        "--cache-dir", help="Response cache directory (default: .rlm/cache)"
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=float,
+        default=512,
+        help="Evict least recently used cache entries above this size",
+    )
+    parser.add_argument(
+        "--cache-max-age",
+        type=float,
+        help="Treat cache entries older than this many hours as misses",
+    )
+    parser.add_argument(
+        "--no-agent-memo",
+        action="store_true",
+        help="Disable reuse of results for identical (context, system_prompt) agent calls",
+    )
+    parser.add_argument(
+        "--agent-memo-dir",
+        help="Also persist memoized agent results in this directory",
+    )
+    parser.add_argument(
+        "--no-prompt-cache",
+        action="store_true",
+        help="Do not send prompt cache breakpoints (for backends without prompt caching)",
+    )
+    parser.add_argument(
+        "--compact-tokens",
+        type=int,
+        default=AgentSettings.compaction_budget,
+        help="Compact old tool results once a request is estimated above this many tokens (0 disables)",
+    )
+    parser.add_argument(
+        "--compact-mode",
+        choices=COMPACTION_MODES,
+        default=AgentSettings.compaction_mode,
+        help="Replace old tool results with stubs, or with a model-written summary",
+    )
+    parser.add_argument(
+        "--compact-keep",
+        type=int,
+        default=AgentSettings.compaction_keep_recent,
+        help="Number of newest tool results that are never compacted",
+    )
+    parser.add_argument(
+        "--log-max-mb",
+        type=float,
+        help="Rotate the JSONL log once it grows past this size",
+    )
+    parser.add_argument(
+        "--log-compress",
+        action="store_true",
+        help="Gzip rotated JSONL logs",
+    )
+    parser.add_argument(
+        "--repl-backend",
+        choices=REPL_BACKENDS,
+        default=AgentSettings.repl_backend,
+        help="Run REPL code in this process or in pooled worker processes",
+    )
+    parser.add_argument(
+        "--repl-workers",
+        type=int,
+        default=2,
+        help="Number of idle REPL worker processes kept ready (subprocess backend)",
+    )
+    parser.add_argument(
+        "--repl-timeout",
+        type=float,
+        default=AgentSettings.repl_timeout,
+        help="Interrupt a run_python execution after this many seconds, not counting time spent waiting on sub-agents (0 disables)",
+    )
+    parser.add_argument(
+        "--repl-memory-mb",
+        type=float,
+        help="Address space limit of each REPL worker process (subprocess backend)",
+    )
+    parser.add_argument(
+        "--repl-cpu-seconds",
+        type=float,
+        help="CPU time limit of one run_python execution (subprocess backend)",
+    )
+    parser.add_argument(
+        "--output-head",
+        type=int,
+        default=AgentSettings.output_head_chars,
+        help="Characters kept from the start of each run_python stdout/stderr",
+    )
+    parser.add_argument(
+        "--output-tail",
+        type=int,
+        default=AgentSettings.output_tail_chars,
+        help="Characters kept from the end of each run_python stdout/stderr",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream model responses and start run_python calls as soon as they are complete",
+    )
+    parser.add_argument(
+        "--api-concurrency",
+        type=int,
+        default=16,
+        help="Maximum number of API requests in flight across all agents",
+    )
+    parser.add_argument(
+        "--api-retries",
+        type=int,
+        default=10,
+        help="Retries with backoff for rate limited, overloaded or failed API requests",
+    )
+    parser.add_argument(
+        "--replay",
+        nargs="+",
+        metavar="LOG",
+        help="Answer model calls from recorded .rlm logs instead of the API (works offline)",
+    )
+    parser.add_argument(
+        "--routing-config",
+        help="TOML or JSON file with model tiers by recursion depth (see rlm.routing)",
+    )
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="Model of the root agent")
+    parser.add_argument(
+        "--max-tokens",
+        type=int,
+        default=DEFAULT_MAX_TOKENS,
+        help="max_tokens of the root agent",
+    )
+    parser.add_argument(
+        "--thinking-budget",
+        type=int,
+        help="Extended thinking budget in tokens for the root agent",
+    )
+    parser.add_argument(
+        "--fast-model",
+        help="Model for sub-agents and tier=\"fast\" calls (default: same as --model)",
+    )
+    parser.add_argument(
+        "--fast-max-tokens",
+        type=int,
+        help="max_tokens for the fast tier (default: --max-tokens)",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        help=f"Maximum recursion depth of sub-agents (root is depth 0; default: {DEFAULT_MAX_DEPTH} or the routing config's max_depth)",
+    )
+    parser.add_argument(
+        "--max-iterations",
+        type=int,
+        default=BudgetLimits.max_iterations,
+        help="Model calls per agent before it returns a partial result (0 disables)",
+    )
+    parser.add_argument(
+        "--max-input-tokens",
+        type=int,
+        help="Input tokens for the whole agent tree",
+    )
+    parser.add_argument(
+        "--max-output-tokens",
+        type=int,
+        help="Output tokens for the whole agent tree",
+    )
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        help="Wall-clock time for the whole agent tree",
+    )
+
+
+def _configure(parser: argparse.ArgumentParser, args: argparse.Namespace) -> AgentSettings:
+    """Set up the process-wide services from parsed options and build agent settings."""
+    if args.repl_backend != "subprocess" and (args.repl_memory_mb or args.repl_cpu_seconds):
+        parser.error("--repl-memory-mb and --repl-cpu-seconds require --repl-backend subprocess")
+    if args.routing_config:
+        routing = RoutingPolicy.load(args.routing_config)
+    else:
+        tiers = {"default": ModelRoute(args.model, args.max_tokens, args.thinking_budget)}
+        tiers["fast"] = ModelRoute(
+            args.fast_model or args.model, args.fast_max_tokens or args.max_tokens
+        )
+        routing = RoutingPolicy(tiers, ["default", "fast"] if args.fast_model else None)
+    if args.max_depth is not None:
+        routing.max_depth = args.max_depth
+    settings = AgentSettings(
+        prompt_caching=not args.no_prompt_cache,
+        compaction_budget=args.compact_tokens or None,
+        compaction_keep_recent=args.compact_keep,
+        compaction_mode=args.compact_mode,
+        repl_backend=args.repl_backend,
+        repl_timeout=args.repl_timeout or None,
+        output_head_chars=args.output_head,
+        output_tail_chars=args.output_tail,
+        streaming=args.stream,
+        routing=routing,
+        budget=BudgetLimits(
+            max_iterations=args.max_iterations or None,
+            max_input_tokens=args.max_input_tokens,
+            max_output_tokens=args.max_output_tokens,
+            max_seconds=args.max_seconds,
+        ),
+    )
+    if args.repl_backend == "subprocess":
+        configure_workers(
+            args.repl_workers,
+            memory_limit=int(args.repl_memory_mb * 1024 * 1024) if args.repl_memory_mb else None,
+            cpu_seconds=args.repl_cpu_seconds,
+        ).warm()
+    configure_tracing(
+        LOG_FILE_PATH,
+        max_bytes=int(args.log_max_mb * 1024 * 1024) if args.log_max_mb else None,
+        compress=args.log_compress,
+    )
+    replay = LogReplay(args.replay) if args.replay else None
+    configure_client(
+        max_concurrency=args.api_concurrency,
+        max_retries=args.api_retries,
+        client_factory=(lambda: OfflineClient(replay)) if replay is not None else None,
+    )
+    configure_memo(enabled=not args.no_agent_memo, directory=args.agent_memo_dir)
+    configure_cache(
+        args.cache,
+        args.cache_dir,
+        max_bytes=int(args.cache_max_mb * 1024 * 1024),
+        max_age=args.cache_max_age * 3600 if args.cache_max_age else None,
+    )
+    return settings
+
+
+def _print_run_summary() -> None:
+    if get_cache().mode != "off":
+        print(f"Cache: {get_cache().summary()}")
+    if get_memo().enabled:
+        print(f"Agent memo: {get_memo().summary()}")
+    print(get_metrics().format_summary())
+    get_trace_writer().flush()
+
+
+def batch_main(argv: list[str]) -> None:
+    """`rlm batch`: run every task of a JSONL file in one process."""
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        prog="rlm batch", description="Run RLM over the tasks of a JSONL file"
+    )
+    parser.add_argument(
+        "tasks",
+        help="JSONL file with one task per line: {\"id\", \"context\" or \"context_file\", \"task\"?, \"system_prompt\"?}",
+    )
+    parser.add_argument(
+        "-o", "--output", required=True, help="JSONL file that results are appended to"
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help="File of finished task IDs used to resume (default: <output>.done)",
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=4, help="Number of tasks run concurrently"
+    )
+    _add_agent_arguments(parser)
+    args = parser.parse_args(argv)
+    settings = _configure(parser, args)
+    checkpoint = Checkpoint(args.checkpoint or args.output + ".done")
+    print(f"Logging to: {LOG_FILE_PATH} (run {RUN_ID})")
+    if checkpoint.done:
+        print(f"Resuming: {len(checkpoint.done)} tasks already done")
+
+    async def run_task(task: BatchTask) -> tuple[str, Any]:
+        context = FileContext(task.context_file) if task.context_file else task.context
+        result = await agent_async(
+            context, task.system_prompt or DEFAULT_SYSTEM_PROMPT, settings, task.task
+        )
+        if isinstance(result, PartialResult):
+            return "partial", dataclasses.asdict(result)
+        return "ok", result
+
+    def on_done(task: BatchTask, status: str, latency: float) -> None:
+        log_to_jsonl(
+            {"type": "batch_task", "task_id": task.id, "status": status, "latency": latency}
+        )
+        finished = len(report.latencies)
+        print(f"[batch] {task.id}: {status} in {latency:.1f}s ({finished} done)")
+
+    report = BatchReport()
+    try:
+        asyncio.run(
+            _with_client(
+                run_batch(
+                    load_tasks(args.tasks),
+                    run_task,
+                    args.output,
+                    checkpoint,
+                    args.workers,
+                    on_done,
+                    report,
+                )
+            )
+        )
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume.")
+    finally:
+        checkpoint.close()
+        print(report.format())
+        _print_run_summary()
 
 
-def main():
+def main(argv: list[str] | None = None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["batch"]:
+        return batch_main(argv[1:])
     load_dotenv()
 
     parser = argparse.ArgumentParser(description="Run RLM with context")
-    parser.add_argument("context", help="Context string to process")
+    parser.add_argument(
+        "context",
+        nargs="?",
+        help="Context string to process, or the task when --context-file is given",
+    )
+    parser.add_argument(
+        "--context-file",
+        help="Expose this file in the REPL as a lazy, memory-mapped context",
+    )
     parser.add_argument("-o", "--output", help="Output file path")
-    args = parser.parse_args()
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="Continue an interrupted run from its checkpoints; without a context, "
+        "the original command line is reused and options given now override it",
+    )
+    parser.add_argument(
+        "--no-checkpoint",
+        action="store_true",
+        help=f"Do not checkpoint agents to {SESSIONS_DIR} for --resume",
+    )
+    _add_agent_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.resume:
+        if args.no_checkpoint:
+            parser.error("--resume cannot be combined with --no-checkpoint")
+        meta = SessionStore(SESSIONS_DIR, args.resume).load_meta()
+        if not meta:
+            parser.error(f"no checkpoints of run {args.resume} in {SESSIONS_DIR}")
+        if args.context is None and args.context_file is None:
+            args = parser.parse_args(meta["argv"] + argv)
+    if args.context is None and args.context_file is None:
+        parser.error("either a context string or --context-file is required")
+    settings = _configure(parser, args)
+    if not args.no_checkpoint:
+        store = configure_sessions(SESSIONS_DIR, args.resume or RUN_ID, resume=bool(args.resume))
+        if not args.resume:
+            store.save_meta(
+                {"argv": argv, "log_file": LOG_FILE_PATH, "created": datetime.now().isoformat()}
+            )
 
-    print(f"Context: {args.context}")
-    print(f"Logging to: {LOG_FILE_PATH}")
+    if args.context_file:
+        context: Any = FileContext(args.context_file)
+        task = args.context
+    else:
+        context = args.context
+        task = None
+    print(f"Context: {context}")
+    print(f"Logging to: {LOG_FILE_PATH} (run {RUN_ID})")
     print(f"Tools:{agent_tools.get_tools()}")
-    result = agent(args.context)
+    try:
+        result = agent(context, settings=settings, task=task)
+    except BaseException:
+        if not args.no_checkpoint:
+            print(f"Run interrupted; continue it with: rlm --resume {get_session_store().run_id}")
+        raise
+    finally:
+        _print_run_summary()
 
     if args.output:
         with open(args.output, "w", encoding="utf-8") as f:
@@ -0,0 +1,204 @@
+"""Memoization of agent results keyed by (context, system_prompt)."""
+
+import asyncio
+import contextvars
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+
+def memo_key(
+    context: Any, system_prompt: str, task: str | None = None, variant: Any = None
+) -> str | None:
+    """Return a stable key for an agent call, or None if it cannot be memoized.
+
+    Contexts may provide their own key through a `memo_key()` method; otherwise
+    only plain JSON data is keyed, since str() of arbitrary objects is not a
+    reliable identity. `variant` is JSON data for anything else that changes
+    the result, such as the model the agent runs on.
+    """
+    custom = getattr(context, "memo_key", None)
+    if callable(custom):
+        payload = ["custom", str(custom()), system_prompt, task]
+    else:
+        payload = ["json", context, system_prompt, task]
+    if variant is not None:
+        payload.append(variant)
+    try:
+        canonical = json.dumps(
+            payload, sort_keys=True, ensure_ascii=False, separators=(",", ":")
+        )
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _private_copy(result: Any) -> Any:
+    """Deep copy of a result, so callers that change it do not affect other hits."""
+    try:
+        return copy.deepcopy(result)
+    except Exception:
+        return result
+
+
+# Keys of the memoized calls that the current agent runs inside
+_active_keys: contextvars.ContextVar[frozenset[str]] = contextvars.ContextVar(
+    "rlm_memo_active_keys", default=frozenset()
+)
+
+
+class AgentMemo:
+    """Two-tier result store with single-flight deduplication.
+
+    Completed results live in a bounded in-memory LRU and, when `directory` is
+    set, in JSON files there. Every hit gets its own deep copy of the result.
+    Identical calls that are still running share
+    one execution instead of starting a second agent, unless the running call
+    is an ancestor of the caller: a sub-agent waiting on its own ancestor
+    would never finish, so it runs uncached.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        directory: str | os.PathLike[str] | None = None,
+        enabled: bool = True,
+    ):
+        self.max_entries = max_entries
+        self.directory = Path(directory) if directory else None
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, Any] = OrderedDict()
+        self._inflight: dict[str, tuple[asyncio.AbstractEventLoop, asyncio.Future[Any]]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        assert self.directory is not None
+        return self.directory / f"{key}.json"
+
+    def _lookup(self, key: str) -> tuple[bool, Any, str]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return True, self._memory[key], "memory"
+        if self.directory is not None:
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    result = json.load(f)["result"]
+            except (OSError, ValueError, KeyError):
+                return False, None, ""
+            self._remember(key, result)
+            return True, result, "disk"
+        return False, None, ""
+
+    def _remember(self, key: str, result: Any) -> None:
+        with self._lock:
+            self._memory[key] = result
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _persist(self, key: str, result: Any) -> None:
+        if self.directory is None:
+            return
+        try:
+            payload = json.dumps({"result": result}, ensure_ascii=False)
+        except (TypeError, ValueError):
+            return  # Only JSON results survive across processes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path(key).with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, self._path(key))
+
+    async def run(
+        self,
+        key: str | None,
+        factory: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] | None = None,
+    ) -> tuple[Any, str | None]:
+        """Return `(result, source)`, running `factory` only when needed.
+
+        `source` is "memory", "disk" or "inflight" for a hit and None when the
+        result was computed by this call. Results rejected by `cacheable` are
+        shared with in-flight callers but not stored.
+        """
+        if not self.enabled or key is None:
+            return await factory(), None
+
+        if key in _active_keys.get():
+            with self._lock:
+                self.misses += 1
+            return await factory(), None
+
+        found, result, source = self._lookup(key)
+        if found:
+            with self._lock:
+                self.hits += 1
+            return _private_copy(result), source
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            inflight = self._inflight.get(key)
+            # Futures are bound to their loop, so only share within one loop
+            if inflight is not None and inflight[0] is loop:
+                self.hits += 1
+                leader = inflight[1]
+            else:
+                self.misses += 1
+                leader = None
+                future: asyncio.Future[Any] = loop.create_future()
+                self._inflight[key] = (loop, future)
+        if leader is not None:
+            return _private_copy(await asyncio.shield(leader)), "inflight"
+
+        # Sub-agents started by `factory` inherit the key as an ancestor
+        token = _active_keys.set(_active_keys.get() | {key})
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else is waiting
+            raise
+        else:
+            # Kept apart from the object returned to this caller
+            future.set_result(_private_copy(result))
+            if cacheable is None or cacheable(result):
+                self._remember(key, _private_copy(result))
+                self._persist(key, result)
+            return result, None
+        finally:
+            _active_keys.reset(token)
+            with self._lock:
+                if self._inflight.get(key, (None, None))[1] is future:
+                    del self._inflight[key]
+
+    def summary(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses"
+
+
+# Global memo instance
+_memo = AgentMemo()
+
+
+def configure_memo(
+    enabled: bool = True, max_entries: int = 256, directory: str | None = None
+) -> AgentMemo:
+    """Replace the global agent memo."""
+    global _memo
+    _memo = AgentMemo(max_entries=max_entries, directory=directory, enabled=enabled)
+    return _memo
+
+
+def get_memo() -> AgentMemo:
+    """Get the global agent memo instance."""
+    return _memo
@@ -0,0 +1,141 @@
+"""Latency and token metrics for LLM calls and REPL executions."""
+
+import math
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Callable
+
+Exporter = Callable[[dict[str, Any]], None]
+
+
+@dataclass
+class LLMCallMetric:
+    span_id: str | None
+    depth: int
+    latency: float
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    stop_reason: str | None = None
+    # Served from the on-disk response cache instead of the API
+    cached: bool = False
+    # Failed attempts that were retried after a backoff
+    retries: int = 0
+
+
+@dataclass
+class ReplExecMetric:
+    span_id: str | None
+    depth: int
+    latency: float
+    stdout_chars: int = 0
+    stderr_chars: int = 0
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile of `values` for `q` in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(q / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+class MetricsCollector:
+    """Collects per-span metrics and forwards each record to exporters."""
+
+    def __init__(self):
+        self.llm_calls: list[LLMCallMetric] = []
+        self.repl_execs: list[ReplExecMetric] = []
+        self._exporters: list[Exporter] = []
+        self._lock = threading.Lock()
+
+    def add_exporter(self, exporter: Exporter) -> None:
+        """Call `exporter` with a dict for every recorded metric."""
+        self._exporters.append(exporter)
+
+    def _export(self, kind: str, metric: LLMCallMetric | ReplExecMetric) -> None:
+        record = {"kind": kind, **asdict(metric)}
+        for exporter in list(self._exporters):
+            try:
+                exporter(record)
+            except Exception as e:
+                print(f"Warning: metrics exporter {exporter!r} failed: {e}")
+
+    def record_llm_call(self, metric: LLMCallMetric) -> None:
+        with self._lock:
+            self.llm_calls.append(metric)
+        self._export("llm_call", metric)
+
+    def record_repl_exec(self, metric: ReplExecMetric) -> None:
+        with self._lock:
+            self.repl_execs.append(metric)
+        self._export("repl_exec", metric)
+
+    def summary(self) -> dict[str, Any]:
+        """Aggregate everything recorded so far."""
+        with self._lock:
+            llm_calls = list(self.llm_calls)
+            repl_execs = list(self.repl_execs)
+        llm_latencies = [m.latency for m in llm_calls if not m.cached]
+        repl_latencies = [m.latency for m in repl_execs]
+        stop_reasons: dict[str, int] = {}
+        for m in llm_calls:
+            key = m.stop_reason or "unknown"
+            stop_reasons[key] = stop_reasons.get(key, 0) + 1
+        llm_time = sum(m.latency for m in llm_calls)
+        repl_time = sum(repl_latencies)
+        return {
+            "spans": len({m.span_id for m in llm_calls}),
+            "llm_calls": len(llm_calls),
+            "llm_cached_calls": sum(m.cached for m in llm_calls),
+            "llm_retries": sum(m.retries for m in llm_calls),
+            "llm_p50": percentile(llm_latencies, 50),
+            "llm_p95": percentile(llm_latencies, 95),
+            "llm_time": llm_time,
+            "input_tokens": sum(m.input_tokens for m in llm_calls),
+            "output_tokens": sum(m.output_tokens for m in llm_calls),
+            "cache_read_tokens": sum(m.cache_read_tokens for m in llm_calls),
+            "cache_write_tokens": sum(m.cache_write_tokens for m in llm_calls),
+            "stop_reasons": stop_reasons,
+            "repl_execs": len(repl_execs),
+            "repl_p50": percentile(repl_latencies, 50),
+            "repl_p95": percentile(repl_latencies, 95),
+            "repl_time": repl_time,
+            "repl_output_chars": sum(m.stdout_chars + m.stderr_chars for m in repl_execs),
+        }
+
+    def format_summary(self) -> str:
+        s = self.summary()
+        busy = s["llm_time"] + s["repl_time"] or 1.0
+        return "\n".join(
+            [
+                "Run summary:",
+                f"  Agents: {s['spans']}",
+                f"  LLM calls: {s['llm_calls']} ({s['llm_cached_calls']} cached, {s['llm_retries']} retries), "
+                f"p50 {s['llm_p50']:.2f}s, p95 {s['llm_p95']:.2f}s",
+                f"  Tokens: {s['input_tokens']} in, {s['output_tokens']} out, "
+                f"{s['cache_read_tokens']} cache read, {s['cache_write_tokens']} cache write",
+                f"  Stop reasons: {s['stop_reasons']}",
+                f"  REPL executions: {s['repl_execs']}, "
+                f"p50 {s['repl_p50']:.2f}s, p95 {s['repl_p95']:.2f}s, "
+                f"{s['repl_output_chars']} output chars",
+                f"  Time split: LLM {s['llm_time']:.2f}s ({100 * s['llm_time'] / busy:.0f}%), "
+                f"REPL {s['repl_time']:.2f}s ({100 * s['repl_time'] / busy:.0f}%)",
+            ]
+        )
+
+
+# Global metrics instance
+_metrics = MetricsCollector()
+
+
+def get_metrics() -> MetricsCollector:
+    """Get the global metrics collector instance."""
+    return _metrics
+
+
+def add_exporter(exporter: Exporter) -> None:
+    """Register an exporter on the global metrics collector."""
+    _metrics.add_exporter(exporter)
@@ -0,0 +1,243 @@
+"""Offline stand-ins for the Messages API: replayed logs and scripted replies.
+
+`OfflineClient` takes the place of `AsyncAnthropic` and answers every request
+with a function of the request, so agents run without network access and
+with repeatable responses. `LogReplay` is such a function built from recorded
+`.rlm` logs; `tool_call` and `text_reply` build scripted responses.
+"""
+
+import asyncio
+import gzip
+import itertools
+import json
+import threading
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable
+
+from anthropic.types import Message
+
+from rlm.client import ClientManager, configure_client
+
+# Maps the keyword arguments of a messages.create call to its response
+Responder = Callable[[dict[str, Any]], Message]
+
+_ids = itertools.count(1)
+
+
+def make_message(
+    content: list[dict[str, Any]],
+    stop_reason: str = "end_turn",
+    usage: dict[str, Any] | None = None,
+    model: str = "offline",
+) -> Message:
+    return Message.model_validate(
+        {
+            "id": f"msg_offline_{next(_ids)}",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": usage or {"input_tokens": 0, "output_tokens": 0},
+        }
+    )
+
+
+def tool_call(code: str, input_tokens: int = 100, output_tokens: int = 20) -> Message:
+    """Response that runs `code` with the run_python tool."""
+    return make_message(
+        [
+            {
+                "type": "tool_use",
+                "id": f"toolu_offline_{next(_ids)}",
+                "name": "run_python",
+                "input": {"code": code},
+            }
+        ],
+        "tool_use",
+        {"input_tokens": input_tokens, "output_tokens": output_tokens},
+    )
+
+
+def text_reply(text: str, input_tokens: int = 100, output_tokens: int = 20) -> Message:
+    """Plain text response without a tool call."""
+    return make_message(
+        [{"type": "text", "text": text}],
+        "end_turn",
+        {"input_tokens": input_tokens, "output_tokens": output_tokens},
+    )
+
+
+def _field(block: Any, name: str) -> Any:
+    if isinstance(block, dict):
+        return block.get(name)
+    return getattr(block, name, None)
+
+
+def _blocks(message: Any) -> list[Any]:
+    content = _field(message, "content")
+    if isinstance(content, str):
+        return [{"type": "text", "text": content}]
+    return list(content or [])
+
+
+def _signature(blocks: list[Any]) -> str:
+    """Identity of an assistant turn: its tool_use IDs, or its text."""
+    parts = [
+        _field(block, "id") if _field(block, "type") == "tool_use" else _field(block, "text")
+        for block in blocks
+        if _field(block, "type") in ("tool_use", "text")
+    ]
+    return json.dumps(parts, ensure_ascii=False)
+
+
+def _prompt(request: dict[str, Any]) -> str:
+    for block in _blocks(request["messages"][0]):
+        if _field(block, "type") == "text":
+            return str(_field(block, "text"))
+    return ""
+
+
+class _Recording:
+    """Assistant turns of one recorded agent, with the signature of each."""
+
+    def __init__(self, turns: list[dict[str, Any]]):
+        self.turns = turns
+        self.signatures = [_signature(turn["content"]) for turn in turns]
+
+
+class LogReplay:
+    """Answers requests with the assistant messages of recorded `.rlm` logs.
+
+    An agent is matched to the recordings with the same first user message,
+    and its next response is the turn after the assistant turns it already
+    has. Agents with the same prompt take the recordings in turn; on later
+    turns, the recording whose earlier turns match the agent's history is
+    used, so concurrent agents each keep to their own recording. Requests
+    without tools, such as compaction summaries, get a fixed reply.
+    """
+
+    def __init__(self, paths: list[str]):
+        self._by_prompt: dict[str, list[_Recording]] = defaultdict(list)
+        # Number of agents started per prompt, to hand out recordings in turn
+        self._starts: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        for path in paths:
+            self._load(path)
+        if not self._by_prompt:
+            raise ValueError(f"No recorded agents in {', '.join(paths)}")
+
+    def _load(self, path: str) -> None:
+        opener = gzip.open if path.endswith(".gz") else open
+        agents: dict[Any, tuple[str, list[dict[str, Any]]]] = {}
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                span = (entry.get("run_id"), entry.get("span_id"))
+                if entry.get("type") == "user_message" and span not in agents:
+                    text = next(
+                        (b.get("text", "") for b in entry.get("content", []) if b.get("type") == "text"),
+                        "",
+                    )
+                    agents[span] = (text, [])
+                elif entry.get("type") == "assistant_message" and span in agents:
+                    agents[span][1].append(entry)
+        for prompt, turns in agents.values():
+            if turns:
+                self._by_prompt[prompt].append(_Recording(turns))
+
+    def __call__(self, request: dict[str, Any]) -> Message:
+        if not request.get("tools"):
+            return text_reply("[summary not available in replay]")
+        prompt = _prompt(request)
+        recordings = self._by_prompt.get(prompt)
+        if not recordings:
+            raise LookupError(f"No recorded agent starts with {prompt[:120]!r}")
+        history = [
+            _signature(_blocks(m)) for m in request["messages"] if _field(m, "role") == "assistant"
+        ]
+        index = len(history)
+        if index == 0:
+            with self._lock:
+                recording = recordings[self._starts[prompt] % len(recordings)]
+                self._starts[prompt] += 1
+        else:
+            recording = next(
+                (r for r in recordings if r.signatures[:index] == history), None
+            )
+            if recording is None:
+                raise LookupError("The agent left its recording; its last turn was not recorded")
+        if index >= len(recording.turns):
+            raise LookupError("The recording of this agent has no more responses")
+        turn = recording.turns[index]
+        return make_message(
+            turn["content"], turn.get("stop_reason") or "end_turn", turn.get("usage"), request["model"]
+        )
+
+
+class _OfflineStream:
+    """`messages.stream()` stand-in that reports each block once it is complete."""
+
+    def __init__(self, response: Any):
+        self._response = response
+        self._message: Message | None = None
+
+    async def __aenter__(self) -> "_OfflineStream":
+        self._message = await self._response
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        return None
+
+    async def _events(self) -> AsyncIterator[Any]:
+        assert self._message is not None
+        for index, block in enumerate(self._message.content):
+            yield SimpleNamespace(type="content_block_stop", index=index, content_block=block)
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._events()
+
+    async def get_final_message(self) -> Message:
+        assert self._message is not None
+        return self._message
+
+
+class _OfflineMessages:
+    def __init__(self, respond: Responder, latency: float):
+        self.respond = respond
+        self.latency = latency
+
+    async def create(self, **request: Any) -> Message:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        return self.respond(request)
+
+    def stream(self, **request: Any) -> _OfflineStream:
+        return _OfflineStream(self.create(**request))
+
+
+class OfflineClient:
+    """Stand-in for `AsyncAnthropic` that never touches the network.
+
+    `latency` seconds are slept before each response to model API time.
+    """
+
+    def __init__(self, respond: Responder, latency: float = 0.0):
+        self.messages = _OfflineMessages(respond, latency)
+
+    async def close(self) -> None:
+        return None
+
+
+def configure_offline(
+    respond: Responder, latency: float = 0.0, **options: Any
+) -> ClientManager:
+    """Replace the global client manager with one that answers offline."""
+    return configure_client(
+        client_factory=lambda: OfflineClient(respond, latency), **options
+    )
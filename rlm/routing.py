@@ -0,0 +1,121 @@
+"""Model selection by recursion depth and tier hint."""
+
+import json
+import os
+import tomllib
+from dataclasses import dataclass
+from typing import Any
+
+# Deepest sub-agent allowed unless a policy sets its own limit (root is depth 0)
+DEFAULT_MAX_DEPTH = 8
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """Generation settings for one tier."""
+
+    model: str
+    max_tokens: int
+    # Extended thinking budget in tokens (None disables thinking)
+    thinking_budget: int | None = None
+
+    def __post_init__(self):
+        if self.thinking_budget is not None and self.thinking_budget >= self.max_tokens:
+            raise ValueError("thinking_budget must be smaller than max_tokens")
+
+    def request_fields(self) -> dict[str, Any]:
+        """Fields of a messages request that this route controls."""
+        fields: dict[str, Any] = {"model": self.model, "max_tokens": self.max_tokens}
+        if self.thinking_budget is not None:
+            fields["thinking"] = {"type": "enabled", "budget_tokens": self.thinking_budget}
+        return fields
+
+
+class RoutingPolicy:
+    """Picks the route of an agent from its tier hint or its recursion depth.
+
+    `tiers` maps tier names to routes. `by_depth` names the tier used at depth
+    0, 1, ...; deeper agents use the last entry. A tier passed explicitly to
+    `agent(..., tier=...)` wins over the depth; unknown tier hints are
+    ignored, since they come from model-written code. Agents deeper than
+    `max_depth` are refused; `None` removes the limit.
+    """
+
+    def __init__(
+        self,
+        tiers: dict[str, ModelRoute],
+        by_depth: list[str] | None = None,
+        max_depth: int | None = DEFAULT_MAX_DEPTH,
+    ):
+        if not tiers:
+            raise ValueError("Routing policy needs at least one tier")
+        self.tiers = dict(tiers)
+        self.by_depth = list(by_depth) if by_depth else [next(iter(self.tiers))]
+        unknown = [name for name in self.by_depth if name not in self.tiers]
+        if unknown:
+            raise ValueError(f"Unknown tiers in by_depth: {', '.join(unknown)}")
+        self.max_depth = max_depth
+
+    @classmethod
+    def single(cls, model: str, max_tokens: int) -> "RoutingPolicy":
+        """Policy that uses the same model at every depth."""
+        return cls({"default": ModelRoute(model, max_tokens)})
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "RoutingPolicy":
+        """Build a policy from parsed config data.
+
+        Example (TOML):
+
+            by_depth = ["strong", "fast"]
+            max_depth = 4
+
+            [tiers.strong]
+            model = "claude-opus-4-1"
+            max_tokens = 8000
+            thinking_budget = 4000
+
+            [tiers.fast]
+            model = "claude-haiku-4-5"
+            max_tokens = 2000
+        """
+        tiers = {
+            name: ModelRoute(
+                model=str(tier["model"]),
+                max_tokens=int(tier["max_tokens"]),
+                thinking_budget=(
+                    int(tier["thinking_budget"])
+                    if tier.get("thinking_budget") is not None
+                    else None
+                ),
+            )
+            for name, tier in data.get("tiers", {}).items()
+        }
+        return cls(
+            tiers,
+            by_depth=data.get("by_depth"),
+            max_depth=int(data.get("max_depth", DEFAULT_MAX_DEPTH)),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "RoutingPolicy":
+        """Load a policy from a .toml or .json file."""
+        if os.path.splitext(path)[1].lower() == ".toml":
+            with open(path, "rb") as f:
+                return cls.from_dict(tomllib.load(f))
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def route(self, depth: int, tier: str | None = None) -> tuple[str, ModelRoute]:
+        """Return the tier name and route for an agent at `depth`."""
+        if tier is None or tier not in self.tiers:
+            tier = self.by_depth[min(depth, len(self.by_depth) - 1)]
+        return tier, self.tiers[tier]
+
+    def check_depth(self, depth: int) -> None:
+        """Raise RecursionError if an agent at `depth` would be too deep."""
+        if self.max_depth is not None and depth > self.max_depth:
+            raise RecursionError(
+                f"Maximum agent recursion depth ({self.max_depth}) reached; "
+                "solve this sub-task with code in the current REPL instead of another agent()"
+            )
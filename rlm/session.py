@@ -0,0 +1,257 @@
+"""Checkpoints of in-flight agents for resuming interrupted runs."""
+
+import contextvars
+import io
+import json
+import os
+import pickle
+import sys
+import threading
+import types
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+# REPL names bound by the agent itself, rebuilt on resume instead of saved
+AGENT_NAMES = frozenset(
+    {
+        "__name__",
+        "__doc__",
+        "__builtins__",
+        "FINAL",
+        "get_tools",
+        "context",
+        "agent",
+        "agent_map",
+        "agent_batch",
+        "agent_reduce",
+    }
+)
+
+
+# Pickled REPL variables kept per checkpoint; agents with more state are
+# resumed by re-executing their code instead
+MAX_SNAPSHOT_BYTES = 8 * 1024 * 1024
+
+
+class _SnapshotFull(Exception):
+    pass
+
+
+class _CappedBuffer(io.BytesIO):
+    """Pickle target that gives up once `limit` bytes have been written."""
+
+    def __init__(self, limit: int):
+        super().__init__()
+        self.limit = limit
+
+    def write(self, data: Any) -> int:
+        if self.tell() + len(data) > self.limit:
+            raise _SnapshotFull()
+        return super().write(data)
+
+
+def snapshot_namespace(
+    namespace: dict[str, Any], max_bytes: int = MAX_SNAPSHOT_BYTES
+) -> tuple[dict[str, bytes], dict[str, str], list[str]]:
+    """Pickle the variables of a REPL namespace one by one.
+
+    Returns the pickled variables, the imported modules by name, and the names
+    that were not saved: values that cannot be pickled, such as functions and
+    classes defined in the REPL, or that would take the snapshot past
+    `max_bytes`. A single unsaved name means the agent is resumed by
+    re-executing its code, so the snapshot stops there and keeps no variables.
+    """
+    variables: dict[str, bytes] = {}
+    modules: dict[str, str] = {}
+    unsaved: list[str] = []
+    for name, value in list(namespace.items()):
+        if name in AGENT_NAMES:
+            continue
+        if isinstance(value, types.ModuleType):
+            modules[name] = value.__name__
+            continue
+        if unsaved:
+            unsaved.append(name)
+            continue
+        buffer = _CappedBuffer(max_bytes)
+        try:
+            # Large strings and flat containers are known to be too big unpickled
+            if sys.getsizeof(value) > max_bytes:
+                raise _SnapshotFull()
+            pickle.dump(value, buffer)
+        except Exception:
+            unsaved.append(name)
+            continue
+        variables[name] = buffer.getvalue()
+        max_bytes -= len(variables[name])
+    if unsaved:
+        variables = {}
+    return variables, modules, unsaved
+
+
+def _picklable(value: Any) -> Any:
+    """Return `value` if it can be saved in a checkpoint, otherwise its repr."""
+    try:
+        pickle.dumps(value)
+    except Exception:
+        return repr(value)
+    return value
+
+
+@dataclass
+class AgentCheckpoint:
+    """Saved state of one agent, written after every model call and iteration."""
+
+    # "0" for the first root agent; children append ".<n>" for the nth sub-agent
+    agent_id: str
+    parent_id: str | None
+    depth: int
+    # "running" or "done"
+    status: str = "running"
+    conversation: list[Any] = field(default_factory=list)
+    iteration: int = 0
+    # Budget counters of the agent, including its sub-agents' tokens
+    usage: dict[str, Any] = field(default_factory=dict)
+    # Retries left, wrap-up nudge sent and last output of the agent loop
+    loop_state: dict[str, Any] = field(default_factory=dict)
+    # Number of sub-agents started so far
+    children: int = 0
+    # REPL state at the end of the last iteration; empty if `unsaved` is not
+    variables: dict[str, bytes] = field(default_factory=dict)
+    modules: dict[str, str] = field(default_factory=dict)
+    unsaved: list[str] = field(default_factory=list)
+    # Code of every finished run_python call, re-executed if `unsaved` is not empty
+    history: list[str] = field(default_factory=list)
+    result: Any = None
+
+    def finish(self, result: Any) -> None:
+        self.status = "done"
+        self.result = _picklable(result)
+        # REPL state is not needed to return a stored result
+        self.variables, self.modules, self.history = {}, {}, []
+
+    def load_variables(self) -> dict[str, Any]:
+        return {name: pickle.loads(data) for name, data in self.variables.items()}
+
+    def import_code(self) -> str:
+        """REPL code that re-imports the saved modules under their names."""
+        return "\n".join(f"import {module} as {name}" for name, module in self.modules.items())
+
+
+class SessionStore:
+    """Checkpoint files of one run, one pickle per agent.
+
+    Files live in `<directory>/<run_id>/`. A resumed run reads the
+    checkpoints of the run it resumes and keeps writing to the same
+    directory, so it can be resumed again. Agent IDs follow the call
+    structure, so a re-executed `agent()` call finds the checkpoint of the
+    sub-agent it started before.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike[str] | None = None,
+        run_id: str = "",
+        resume: bool = False,
+    ):
+        self.path = Path(directory) / run_id if directory else None
+        self.run_id = run_id
+        self.resume = resume
+        self._roots = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def _file(self, agent_id: str) -> Path:
+        assert self.path is not None
+        return self.path / f"{agent_id}.pkl"
+
+    def next_root_id(self) -> str:
+        with self._lock:
+            agent_id = str(self._roots)
+            self._roots += 1
+        return agent_id
+
+    def save(self, checkpoint: AgentCheckpoint) -> None:
+        if self.path is None:
+            return
+        try:
+            payload = pickle.dumps(checkpoint)
+        except Exception as e:
+            print(f"Warning: could not checkpoint agent {checkpoint.agent_id}: {e}")
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        path = self._file(checkpoint.agent_id)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+    def load(self, agent_id: str) -> AgentCheckpoint | None:
+        """Checkpoint of `agent_id` from the resumed run, if any."""
+        if self.path is None or not self.resume:
+            return None
+        try:
+            with open(self._file(agent_id), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save_meta(self, meta: dict[str, Any]) -> None:
+        if self.path is None:
+            return
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    def load_meta(self) -> dict[str, Any]:
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path / "meta.json", "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+
+_current_checkpoint: contextvars.ContextVar[AgentCheckpoint | None] = (
+    contextvars.ContextVar("rlm_current_checkpoint", default=None)
+)
+
+
+def new_agent_id() -> str:
+    """Allocate the ID of an agent started from the current agent, or of a root."""
+    parent = _current_checkpoint.get()
+    if parent is None:
+        return get_session_store().next_root_id()
+    parent.children += 1
+    return f"{parent.agent_id}.{parent.children}"
+
+
+def enter_checkpoint(checkpoint: AgentCheckpoint) -> None:
+    _current_checkpoint.set(checkpoint)
+
+
+def current_checkpoint() -> AgentCheckpoint | None:
+    return _current_checkpoint.get()
+
+
+# Global session store; disabled until configured
+_store = SessionStore()
+
+
+def configure_sessions(
+    directory: str | None, run_id: str, resume: bool = False
+) -> SessionStore:
+    """Replace the global session store; `directory=None` disables checkpoints."""
+    global _store
+    _store = SessionStore(directory, run_id, resume)
+    return _store
+
+
+def get_session_store() -> SessionStore:
+    """Get the global session store."""
+    return _store
@@ -0,0 +1,210 @@
+"""Buffered JSONL trace writer and agent spans."""
+
+import atexit
+import contextvars
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, TextIO
+
+# Identifies one process run across every log file it writes
+RUN_ID = uuid.uuid4().hex[:12]
+
+
+@dataclass
+class Span:
+    """One agent invocation in the recursive agent tree."""
+
+    run_id: str
+    span_id: str
+    parent_id: str | None
+    depth: int
+    iteration: int = 0
+
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar(
+    "rlm_current_span", default=None
+)
+
+
+def start_span() -> Span:
+    """Create a child of the current span (or a root span) and make it current."""
+    parent = _current_span.get()
+    span = Span(
+        run_id=parent.run_id if parent else RUN_ID,
+        span_id=uuid.uuid4().hex[:16],
+        parent_id=parent.span_id if parent else None,
+        depth=parent.depth + 1 if parent else 0,
+    )
+    _current_span.set(span)
+    return span
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def span_fields() -> dict[str, Any]:
+    """Return the trace fields attached to every log entry."""
+    span = _current_span.get()
+    return {
+        "run_id": span.run_id if span else RUN_ID,
+        "span_id": span.span_id if span else None,
+        "parent_span_id": span.parent_id if span else None,
+        "depth": span.depth if span else 0,
+        "iteration": span.iteration if span else 0,
+        "ts": time.time(),
+        "mono": time.monotonic(),
+    }
+
+
+class _Flush:
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class TraceWriter:
+    """Appends JSONL entries to a file from a background thread.
+
+    Entries are serialized by the caller, so later mutation of logged objects
+    cannot change them, and written in batches once `flush_bytes` are buffered,
+    every `flush_interval` seconds and at interpreter exit. When `max_bytes`
+    is set, a full file is renamed to `<name>.<n>.jsonl` (gzipped with
+    `compress`) and a fresh file is started.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_bytes: int = 64 * 1024,
+        flush_interval: float = 1.0,
+        max_bytes: int | None = None,
+        compress: bool = False,
+    ):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self._queue: queue.SimpleQueue[Any] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="rlm-trace", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+
+    def write(self, entry: dict[str, Any]) -> None:
+        if self._closed:
+            raise RuntimeError("TraceWriter is closed")
+        self._ensure_started()
+        self._queue.put(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    def flush(self, timeout: float | None = 10.0) -> None:
+        """Block until every entry written so far is on disk."""
+        if self._thread is None or self._closed:
+            return
+        marker = _Flush()
+        self._queue.put(marker)
+        marker.done.wait(timeout)
+
+    def close(self) -> None:
+        if self._thread is None or self._closed:
+            self._closed = True
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self) -> None:
+        buffer: list[str] = []
+        buffered = 0
+        deadline = time.monotonic() + self.flush_interval
+        f: TextIO | None = None
+
+        def flush() -> None:
+            nonlocal f, buffered
+            if buffer:
+                if f is None:
+                    os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                    f = open(self.path, "a", encoding="utf-8")
+                f.writelines(buffer)
+                f.flush()
+                buffer.clear()
+                buffered = 0
+                if self.max_bytes is not None and f.tell() >= self.max_bytes:
+                    f.close()
+                    f = None
+                    self._rotate()
+
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if isinstance(item, str):
+                buffer.append(item)
+                buffered += len(item)
+                if buffered < self.flush_bytes and time.monotonic() < deadline:
+                    continue
+            flush()
+            deadline = time.monotonic() + self.flush_interval
+            if isinstance(item, _Flush):
+                item.done.set()
+            elif item is _STOP:
+                break
+        if f is not None:
+            f.close()
+
+    def _rotate(self) -> None:
+        stem, ext = os.path.splitext(self.path)
+        n = 1
+        while os.path.exists(f"{stem}.{n}{ext}") or os.path.exists(f"{stem}.{n}{ext}.gz"):
+            n += 1
+        rotated = f"{stem}.{n}{ext}"
+        os.replace(self.path, rotated)
+        if self.compress:
+            with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+
+
+_writer: TraceWriter | None = None
+
+
+def configure_tracing(path: str, **options: Any) -> TraceWriter:
+    """Replace the global trace writer, flushing and closing the previous one."""
+    global _writer
+    if _writer is not None:
+        _writer.close()
+    _writer = TraceWriter(path, **options)
+    return _writer
+
+
+def get_trace_writer() -> TraceWriter:
+    """Get the global trace writer instance."""
+    if _writer is None:
+        raise RuntimeError("Tracing is not configured")
+    return _writer
+
+
+def log_event(data: dict[str, Any]) -> None:
+    """Queue a log entry tagged with the current span."""
+    get_trace_writer().write({**data, **span_fields()})
@@ -0,0 +1,314 @@
+"""Pool of pre-started worker processes that host REPL sessions."""
+
+import atexit
+import contextlib
+import multiprocessing
+import os
+import pickle
+import signal
+import threading
+import traceback
+from collections import deque
+from multiprocessing.connection import Connection
+from typing import Any
+
+from rlm.capture import BoundedOutput
+from rlm.limits import ReplConsole, apply_memory_limit, classify_error, cpu_limit
+from rlm.session import snapshot_namespace
+
+REPL_BACKENDS = ("inprocess", "subprocess")
+
+
+def _picklable(value: Any) -> Any:
+    """Return `value` if it can cross the pipe, otherwise its repr."""
+    try:
+        pickle.dumps(value)
+    except Exception:
+        return repr(value)
+    return value
+
+
+def _worker_main(
+    conn: Connection, memory_limit: int | None = None, cpu_seconds: float | None = None
+) -> None:
+    """Serve one REPL session over `conn` until the parent disconnects.
+
+    Messages from the parent:
+      ("set", name, value)   bind a REPL variable
+      ("proxy", name)        bind a function that is called back in the parent
+      ("run", code, head, tail)
+                             execute code keeping `head` and `tail` characters of
+                             output, answered by ("done", out, err, out_chars,
+                             err_chars, has_final, final, limit)
+      ("snapshot",)          answered by ("snapshot", variables, modules, unsaved)
+                             with the REPL state pickled for a checkpoint
+    While code runs, the worker may send ("call", name, args, kwargs) and
+    waits for ("return", value) or ("error", exception). The parent interrupts
+    a run with SIGINT; outside of runs SIGINT is ignored.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    apply_memory_limit(memory_limit)
+
+    # Pre-import tools so the first run does not pay for discovery
+    import agent_tools
+
+    agent_tools.discover_tools()
+    agent_tools.load_tools()
+
+    repl_locals: dict[str, object] = {"__name__": "__console__", "__doc__": None}
+    console = ReplConsole(repl_locals)
+    final: dict[str, Any] = {"set": False, "value": None}
+
+    def FINAL(answer: object):
+        final["set"] = True
+        final["value"] = answer
+
+    def get_tools():
+        return agent_tools.get_tools()
+
+    repl_locals["FINAL"] = FINAL
+    repl_locals["get_tools"] = get_tools
+
+    def make_proxy(name: str):
+        def proxy(*args: Any, **kwargs: Any) -> Any:
+            conn.send(("call", name, args, kwargs))
+            kind, value = conn.recv()
+            if kind == "error":
+                raise value
+            return value
+
+        proxy.__name__ = name
+        return proxy
+
+    conn.send(("ready", os.getpid()))
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        kind = message[0]
+        if kind == "set":
+            _, name, value = message
+            repl_locals[name] = value
+            if name == "context":
+                agent_tools.set_active_context(value)
+        elif kind == "proxy":
+            repl_locals[message[1]] = make_proxy(message[1])
+        elif kind == "snapshot":
+            conn.send(("snapshot", *snapshot_namespace(repl_locals)))
+        elif kind == "run":
+            _, code, head, tail = message
+            out = BoundedOutput(head, tail)
+            err = BoundedOutput(head, tail)
+            console.last_error = None
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            try:
+                with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+                    try:
+                        with cpu_limit(cpu_seconds):
+                            console.runsource(code, "<console>", "exec")
+                    except SystemExit:
+                        print("SystemExit: exit()/quit() is not allowed in this REPL session.")
+                    except BaseException as e:
+                        # Limits can also fire outside user code, e.g. while compiling
+                        console.last_error = e
+                        print(traceback.format_exc())
+            finally:
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+            conn.send(
+                (
+                    "done",
+                    out.getvalue(),
+                    err.getvalue(),
+                    out.total,
+                    err.total,
+                    final["set"],
+                    _picklable(final["value"]),
+                    classify_error(console.last_error),
+                )
+            )
+
+
+class WorkerProcess:
+    """Parent-side handle of one worker process."""
+
+    def __init__(
+        self, ctx: Any, memory_limit: int | None = None, cpu_seconds: float | None = None
+    ):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, memory_limit, cpu_seconds),
+            name="rlm-repl-worker",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def wait_ready(self, timeout: float = 60.0) -> None:
+        if not self.conn.poll(timeout):
+            self.close()
+            raise RuntimeError("REPL worker did not start in time")
+        try:
+            kind, _ = self.conn.recv()
+        except (EOFError, OSError):
+            self.close()
+            raise RuntimeError(f"REPL worker exited during startup (exit code {self.exitcode})")
+        if kind != "ready":
+            self.close()
+            raise RuntimeError(f"Unexpected message from REPL worker: {kind!r}")
+
+    def send(self, message: Any) -> None:
+        self.conn.send(message)
+
+    def recv(self) -> Any:
+        return self.conn.recv()
+
+    def poll(self, timeout: float | None) -> bool:
+        return self.conn.poll(timeout)
+
+    def interrupt(self) -> None:
+        """Interrupt the code currently running in the worker."""
+        if self.process.pid is None:
+            return
+        if hasattr(signal, "SIGINT") and os.name == "posix":
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(self.process.pid, signal.SIGINT)
+        else:
+            self.process.terminate()
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    @property
+    def exitcode(self) -> int | None:
+        # Give a process that just closed its pipe a moment to be reaped
+        self.process.join(1)
+        return self.process.exitcode
+
+    def close(self) -> None:
+        with contextlib.suppress(OSError):
+            self.conn.close()
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.kill()
+        self.process.join(1)
+
+
+class WorkerPool:
+    """Keeps `size` idle, fully imported workers ready to host a REPL.
+
+    Workers are stateful, so each is handed out once and discarded when its
+    REPL closes; the pool refills itself in the background.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        start_method: str | None = None,
+        memory_limit: int | None = None,
+        cpu_seconds: float | None = None,
+    ):
+        if start_method is None:
+            start_method = (
+                "forkserver"
+                if "forkserver" in multiprocessing.get_all_start_methods()
+                else "spawn"
+            )
+        self.size = size
+        self.memory_limit = memory_limit
+        self.cpu_seconds = cpu_seconds
+        self._ctx = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # Workers fork from a server that already imported these
+            self._ctx.set_forkserver_preload(
+                ["rlm.workers", "rlm.limits", "rlm.session", "agent_tools"]
+            )
+        self._idle: deque[WorkerProcess] = deque()
+        self._lock = threading.Lock()
+        self._refilling = False
+        self._closed = False
+        atexit.register(self.close)
+
+    def _spawn(self) -> WorkerProcess:
+        worker = WorkerProcess(self._ctx, self.memory_limit, self.cpu_seconds)
+        worker.wait_ready()
+        return worker
+
+    def _refill(self) -> None:
+        try:
+            while True:
+                with self._lock:
+                    if self._closed or len(self._idle) >= self.size:
+                        return
+                try:
+                    worker = self._spawn()
+                except Exception as e:
+                    if not self._closed:
+                        print(f"Warning: Failed to start REPL worker: {e}")
+                    return
+                with self._lock:
+                    if self._closed:
+                        worker.close()
+                        return
+                    self._idle.append(worker)
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def warm(self) -> None:
+        """Start filling the pool in the background."""
+        with self._lock:
+            if self._refilling or self._closed:
+                return
+            self._refilling = True
+        threading.Thread(target=self._refill, name="rlm-worker-pool", daemon=True).start()
+
+    def acquire(self) -> WorkerProcess:
+        """Take an idle worker, starting one if none is ready."""
+        worker: WorkerProcess | None = None
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.popleft()
+                if candidate.alive:
+                    worker = candidate
+                    break
+                candidate.close()
+        self.warm()
+        return worker if worker is not None else self._spawn()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for worker in idle:
+            worker.close()
+
+
+_pool: WorkerPool | None = None
+
+
+def configure_workers(
+    size: int = 2,
+    start_method: str | None = None,
+    memory_limit: int | None = None,
+    cpu_seconds: float | None = None,
+) -> WorkerPool:
+    """Replace the global worker pool."""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+    _pool = WorkerPool(size, start_method, memory_limit, cpu_seconds)
+    return _pool
+
+
+def get_worker_pool() -> WorkerPool:
+    """Get the global worker pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = WorkerPool()
+    return _pool
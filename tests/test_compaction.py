@@ -0,0 +1,35 @@
+import asyncio
+import unittest
+
+from rlm.compaction import COMPACTED_MARKER, compact_conversation
+
+
+def _conversation(outputs):
+    conversation = []
+    for i, output in enumerate(outputs):
+        conversation.append(
+            {"role": "assistant", "content": [{"type": "tool_use", "id": f"t{i}", "name": "run_python", "input": {}}]}
+        )
+        conversation.append(
+            {"role": "user", "content": [{"type": "tool_result", "tool_use_id": f"t{i}", "content": output}]}
+        )
+    return conversation
+
+
+class CompactConversationTest(unittest.TestCase):
+    def test_short_results_are_left_alone(self):
+        conversation = _conversation(['{"stdout": ""}'] * 10)
+        self.assertIsNone(asyncio.run(compact_conversation(conversation, budget=10)))
+        self.assertEqual(conversation, _conversation(['{"stdout": ""}'] * 10))
+
+    def test_long_results_are_stubbed_once(self):
+        conversation = _conversation(["x" * 4000] + ['{"stdout": ""}'] * 9)
+        result = asyncio.run(compact_conversation(conversation, budget=10))
+        self.assertEqual(result.compacted_results, 1)
+        self.assertLess(result.after_tokens, result.before_tokens)
+        self.assertTrue(conversation[1]["content"][0]["content"].startswith(COMPACTED_MARKER))
+        self.assertIsNone(asyncio.run(compact_conversation(conversation, budget=10)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import os
+import tempfile
+import unittest
+
+from rlm.context import FileContext
+
+
+class FileContextChunksTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"alpha\nbeta\ngamma\ndelta\nepsilon\nzeta\n")
+        self.addCleanup(os.remove, self.path)
+
+    def test_aligned_chunks_keep_overlap(self):
+        chunks = [c.head(100) for c in FileContext(self.path).chunks(8, overlap=4)]
+        self.assertEqual(chunks[:2], ["alpha\nbeta\n", "beta\ngamma\n"])
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertTrue(chunk.startswith(previous.splitlines(keepends=True)[-1]))
+
+    def test_aligned_chunks_without_overlap_cover_the_file(self):
+        chunks = [c.head(100) for c in FileContext(self.path).chunks(8)]
+        self.assertEqual("".join(chunks), "alpha\nbeta\ngamma\ndelta\nepsilon\nzeta\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
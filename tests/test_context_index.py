@@ -0,0 +1,31 @@
+import re
+import unittest
+
+from agent_tools.context_index import ContextIndex, _required_literals
+
+
+class RequiredLiteralsTest(unittest.TestCase):
+    def test_group_prefixes_are_not_literals(self):
+        self.assertEqual(_required_literals("(?:abc)def"), ["abc", "def"])
+        self.assertEqual(_required_literals("(?P<n>foo)bar"), ["foo", "bar"])
+
+    def test_other_group_constructs_disable_prefiltering(self):
+        for pattern in ["foo(?=bar)", "foo(?!bar)", "(?<=foo)bar", "(?i)foo", "(?x)foo bar", "(?P<n>foo)(?P=n)"]:
+            with self.subTest(pattern=pattern):
+                self.assertEqual(_required_literals(pattern), [])
+
+    def test_literals_occur_in_every_match(self):
+        text = "xx foobar foo bar\nFOO baz"
+        for pattern in ["(?:foo)bar", "(?P<n>foo)bar", "foo(?=bar)", "foo(?!x)", "(?i)foo baz", "(?x)foo bar", "abc+def"]:
+            with self.subTest(pattern=pattern):
+                for match in re.finditer(pattern, text):
+                    for literal in _required_literals(pattern):
+                        self.assertIn(literal, match.group())
+
+    def test_grep_finds_non_capturing_group(self):
+        index = ContextIndex("alpha\nxx foobar\nbeta")
+        self.assertEqual([hit["line"] for hit in index.grep("(?:foo)bar")], [2])
+
+
+if __name__ == "__main__":
+    unittest.main()
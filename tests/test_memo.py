@@ -0,0 +1,66 @@
+import asyncio
+import unittest
+
+from rlm.memo import AgentMemo
+
+
+class AgentMemoTest(unittest.TestCase):
+    def test_nested_call_with_ancestor_key_runs_uncached(self):
+        memo = AgentMemo()
+
+        async def leaf():
+            return "leaf"
+
+        async def parent():
+            # A sub-agent with the same key as its in-flight parent
+            result, source = await memo.run("key", leaf)
+            return result, source
+
+        async def main():
+            return await asyncio.wait_for(memo.run("key", parent), timeout=5)
+
+        (child_result, child_source), source = asyncio.run(main())
+        self.assertEqual(child_result, "leaf")
+        self.assertIsNone(child_source)
+        self.assertIsNone(source)
+
+    def test_concurrent_identical_calls_share_one_run(self):
+        memo = AgentMemo()
+        runs = 0
+
+        async def factory():
+            nonlocal runs
+            runs += 1
+            await asyncio.sleep(0.05)
+            return runs
+
+        async def main():
+            return await asyncio.gather(memo.run("key", factory), memo.run("key", factory))
+
+        (first, _), (second, source) = asyncio.run(main())
+        self.assertEqual(runs, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(source, "inflight")
+
+    def test_hits_get_private_copies(self):
+        memo = AgentMemo()
+
+        async def factory():
+            return {"items": [1, 2]}
+
+        async def main():
+            first, _ = await memo.run("key", factory)
+            first["items"].append(3)
+            second, source = await memo.run("key", factory)
+            second["items"].append(4)
+            third, _ = await memo.run("key", factory)
+            return second, source, third
+
+        second, source, third = asyncio.run(main())
+        self.assertEqual(source, "memory")
+        self.assertEqual(second, {"items": [1, 2, 4]})
+        self.assertEqual(third, {"items": [1, 2]})
+
+
+if __name__ == "__main__":
+    unittest.main()
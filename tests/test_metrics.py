@@ -0,0 +1,17 @@
+import unittest
+
+from rlm.metrics import percentile
+
+
+class PercentileTest(unittest.TestCase):
+    def test_nearest_rank(self):
+        self.assertEqual(percentile([1.0, 2.0], 50), 1.0)
+        self.assertEqual(percentile([float(i) for i in range(1, 21)], 95), 19.0)
+        self.assertEqual(percentile([float(i) for i in range(1, 101)], 50), 50.0)
+        self.assertEqual(percentile([3.0, 1.0, 2.0], 100), 3.0)
+        self.assertEqual(percentile([3.0, 1.0, 2.0], 0), 1.0)
+        self.assertEqual(percentile([], 50), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
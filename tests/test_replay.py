@@ -0,0 +1,57 @@
+import json
+import os
+import tempfile
+import unittest
+
+from rlm.replay import LogReplay
+
+
+def _text(text):
+    return [{"type": "text", "text": text}]
+
+
+def _tool(tool_id, code):
+    return [{"type": "tool_use", "id": tool_id, "name": "run_python", "input": {"code": code}}]
+
+
+class LogReplayTest(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix=".jsonl")
+        self.addCleanup(os.remove, self.path)
+        entries = []
+        # Two agents recorded by different processes reuse the same offline tool IDs
+        for span, prompt, turns in [
+            ("a", "task a", [_text("I think the answer is 42")] * 3 + [_tool("toolu_offline_1", "FINAL(42)")]),
+            ("b", "task b", [_tool("toolu_offline_1", "x = 1"), _tool("toolu_offline_2", "FINAL(x)")]),
+        ]:
+            entries.append({"type": "user_message", "run_id": span, "span_id": span, "content": _text(prompt)})
+            for content in turns:
+                entries.append({"type": "assistant_message", "run_id": span, "span_id": span, "content": content})
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+
+    def replay(self, prompt):
+        replay = LogReplay([self.path])
+        messages = [{"role": "user", "content": _text(prompt)}]
+        responses = []
+        while True:
+            message = replay({"model": "offline", "tools": [{}], "messages": messages})
+            content = [block.model_dump(exclude_none=True) for block in message.content]
+            responses.append(content)
+            if any(block["type"] == "tool_use" and "FINAL" in block["input"]["code"] for block in content):
+                return responses
+            messages = messages + [{"role": "assistant", "content": content}, {"role": "user", "content": _text("go on")}]
+
+    def test_repeated_text_turns_replay_in_order(self):
+        responses = self.replay("task a")
+        self.assertEqual(len(responses), 4)
+        self.assertEqual(responses[3][0]["input"]["code"], "FINAL(42)")
+
+    def test_recordings_with_reused_tool_ids_stay_separate(self):
+        responses = self.replay("task b")
+        self.assertEqual([r[0]["input"]["code"] for r in responses], ["x = 1", "FINAL(x)"])
+
+
+if __name__ == "__main__":
+    unittest.main()
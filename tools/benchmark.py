@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite for RLM
+
+Runs the agent loop against an offline stand-in for the Messages API
+(rlm.replay), so the numbers measure RLM itself, are repeatable and need no
+network or API key. Results are saved as JSON and can be compared with an
+earlier run to spot regressions:
+
+    python tools/benchmark.py -o baseline.json
+    python tools/benchmark.py --compare baseline.json
+
+Metrics ending in `_per_s` or `_speedup` are better when higher; all other
+metrics are times and are better when lower.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Simulated API latency in the fan-out benchmark, in seconds
+FANOUT_LATENCY = 0.05
+
+_SCENARIO = re.compile(r'head of context is ([a-z]+):(\d+)')
+
+
+def scripted_response(request: Dict[str, Any]) -> Any:
+    """Scripted model for contexts of the form `<scenario>:<n>`.
+
+    iter:N runs N trivial REPL steps and finishes, depth:N starts a chain of N
+    nested sub-agents, and fanout:N maps N leaf sub-agents concurrently.
+    """
+    from rlm.replay import text_reply, tool_call
+
+    messages = request['messages']
+    first = messages[0]['content'][0]
+    text = first['text'] if isinstance(first, dict) else first.text
+    match = _SCENARIO.search(text)
+    if match is None:
+        return text_reply('Unknown benchmark scenario')
+    scenario, n = match.group(1), int(match.group(2))
+    turn = sum(1 for m in messages if m['role'] == 'assistant')
+    if scenario == 'iter':
+        return tool_call('x = 1' if turn < n else "FINAL('done')")
+    if scenario == 'depth':
+        return tool_call(f"FINAL(agent('depth:{n - 1}'))" if n > 0 else "FINAL('leaf')")
+    if scenario == 'fanout':
+        return tool_call(f"FINAL(len(agent_map(['leaf:0'] * {n}, max_concurrency={n})))")
+    return tool_call("FINAL('leaf')")
+
+
+def _timed(func: Callable[[], Any], repeat: int) -> float:
+    """Median wall time of `repeat` calls of `func`, after one warm-up call."""
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def bench_iteration_overhead(main: Any, repeat: int, quick: bool) -> Dict[str, float]:
+    """Time the agent loop spends per iteration, with zero API latency."""
+    from rlm.replay import configure_offline
+
+    iterations = 20 if quick else 100
+    configure_offline(scripted_response)
+    results = {}
+    for name, streaming in (('per_iteration_s', False), ('per_iteration_stream_s', True)):
+        settings = main.AgentSettings(streaming=streaming, compaction_budget=None)
+        elapsed = _timed(lambda: main.agent(f'iter:{iterations}', settings=settings), repeat)
+        results[name] = elapsed / (iterations + 1)
+    return results
+
+
+def bench_repl_throughput(main: Any, repeat: int, quick: bool) -> Dict[str, float]:
+    """Executions per second of ReplInstance.run and of the subprocess REPL."""
+    runs = 200 if quick else 2000
+    results = {}
+    for name, code in (('runs_per_s', 'x = 1'), ('print_runs_per_s', "print('x' * 1000)")):
+        repl = main.ReplInstance()
+        elapsed = _timed(lambda: [repl.run(code) for _ in range(runs)], repeat)
+        results[name] = runs / elapsed
+        repl.close()
+
+    repl = main.SubprocessRepl()
+    repl.run('x = 1')  # Start the worker outside the measurement
+    elapsed = _timed(lambda: [repl.run('x = 1') for _ in range(runs // 10)], repeat)
+    results['subprocess_runs_per_s'] = runs // 10 / elapsed
+    repl.close()
+    return results
+
+
+def bench_logging(main: Any, repeat: int, quick: bool) -> Dict[str, float]:
+    """Cost of writing typical log entries, on the caller and in total."""
+    from rlm.tracing import TraceWriter
+
+    entries = 2000 if quick else 20000
+    entry = {
+        'type': 'tool_result',
+        'tool_use_id': 'toolu_benchmark',
+        'result': {'stdout': 'x' * 2000, 'stderr': ''},
+        'latency': 0.01,
+        'output_chars': 2000,
+    }
+    enqueue_times = []
+    total_times = []
+    for _ in range(repeat):
+        path = os.path.join(tempfile.mkdtemp(prefix='rlm-bench-'), 'log.jsonl')
+        writer = TraceWriter(path)
+        start = time.perf_counter()
+        for _ in range(entries):
+            writer.write(entry)
+        enqueued = time.perf_counter()
+        writer.flush()
+        enqueue_times.append(enqueued - start)
+        total_times.append(time.perf_counter() - start)
+        writer.close()
+    return {
+        'enqueue_per_entry_s': statistics.median(enqueue_times) / entries,
+        'written_entries_per_s': entries / statistics.median(total_times),
+    }
+
+
+def bench_recursion(main: Any, repeat: int, quick: bool) -> Dict[str, float]:
+    """Wall time of a chain of nested sub-agents by depth."""
+    from rlm.replay import configure_offline
+
+    configure_offline(scripted_response)
+    routing = main.RoutingPolicy.single(main.DEFAULT_MODEL, main.DEFAULT_MAX_TOKENS)
+    # Chains deeper than the default recursion limit are part of the measurement
+    routing.max_depth = None
+    settings = main.AgentSettings(compaction_budget=None, routing=routing)
+    results = {}
+    for depth in (1, 4) if quick else (1, 4, 16):
+        results[f'depth_{depth}_s'] = _timed(
+            lambda: main.agent(f'depth:{depth}', settings=settings), repeat
+        )
+    return results
+
+
+def bench_fanout(main: Any, repeat: int, quick: bool) -> Dict[str, float]:
+    """Speedup of agent_map over running its sub-agents one after another."""
+    from rlm.replay import configure_offline
+
+    configure_offline(scripted_response, latency=FANOUT_LATENCY)
+    settings = main.AgentSettings(compaction_budget=None)
+    results = {}
+    for width in (4, 16) if quick else (4, 16, 64):
+        elapsed = _timed(lambda: main.agent(f'fanout:{width}', settings=settings), repeat)
+        # The root and every leaf make one API call each
+        serial = (width + 1) * FANOUT_LATENCY
+        results[f'fanout_{width}_s'] = elapsed
+        results[f'fanout_{width}_speedup'] = serial / elapsed
+    return results
+
+
+BENCHMARKS: Dict[str, Callable[[Any, int, bool], Dict[str, float]]] = {
+    'iteration_overhead': bench_iteration_overhead,
+    'repl_throughput': bench_repl_throughput,
+    'logging': bench_logging,
+    'recursion': bench_recursion,
+    'fanout': bench_fanout,
+}
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith('_per_s') or metric.endswith('_speedup')
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    """Print a comparison table and return the metrics that regressed."""
+    regressions = []
+    print(f"{'metric':<45} {'baseline':>12} {'current':>12} {'change':>8}")
+    for bench, metrics in current['benchmarks'].items():
+        for metric, value in metrics.items():
+            name = f'{bench}.{metric}'
+            old = baseline.get('benchmarks', {}).get(bench, {}).get(metric)
+            if not old:
+                print(f'{name:<45} {"-":>12} {value:>12.4g} {"new":>8}')
+                continue
+            change = (value - old) / old
+            worse = -change if higher_is_better(metric) else change
+            flag = '  REGRESSION' if worse > threshold else ''
+            if flag:
+                regressions.append(name)
+            print(f'{name:<45} {old:>12.4g} {value:>12.4g} {change:>+8.1%}{flag}')
+    return regressions
+
+
+def run(selected: List[str], repeat: int, quick: bool) -> Dict[str, Any]:
+    # Logs and checkpoints of the benchmarked agents go to a scratch directory
+    os.chdir(tempfile.mkdtemp(prefix='rlm-bench-'))
+    sys.path.insert(0, REPO_ROOT)
+    from rlm import main
+    from rlm.memo import configure_memo
+
+    # Every call must run, not come from the memo of an earlier repetition
+    configure_memo(enabled=False)
+    results: Dict[str, Any] = {
+        'meta': {
+            'created': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'quick': quick,
+            'repeat': repeat,
+        },
+        'benchmarks': {},
+    }
+    for name in selected:
+        print(f'Running {name}...', file=sys.stderr)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            results['benchmarks'][name] = BENCHMARKS[name](main, repeat, quick)
+    main.get_trace_writer().flush()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the RLM agent loop offline')
+    parser.add_argument('-o', '--output', help='Save results to this JSON file')
+    parser.add_argument('--compare', metavar='BASELINE', help='Compare with results saved by an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown reported as a regression')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='Run only these benchmarks')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per measurement (the median is kept)')
+    parser.add_argument('--quick', action='store_true', help='Smaller workloads for a fast check')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    output = os.path.abspath(args.output) if args.output else None
+
+    results = run(args.only or list(BENCHMARKS), max(1, args.repeat), args.quick)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f'Results saved to {output}')
+    if baseline is not None:
+        regressions = compare(baseline, results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+    else:
+        for bench, metrics in results['benchmarks'].items():
+            for metric, value in metrics.items():
+                print(f'{bench}.{metric}: {value:.4g}')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,109 +3,440 @@
 Log Visualizer for RLM
 
 Converts JSONL log files produced by RLM into Markdown documents for visualization.
+
+Logs are streamed entry by entry, so memory stays bounded by the number of
+entries (one offset each) rather than by the size of the log. Entries of
+recursive sub-agents are regrouped into nested sections using their span IDs.
 """
 
 import argparse
+import contextlib
+import gzip
 import json
 import os
+import shutil
 import sys
-from typing import Dict, Any
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, IO, Iterator, List, Optional, Tuple
+
 
+def _heading(level: int, depth: int) -> str:
+    return '#' * min(6, level + depth)
 
-def convert_entry(entry: Dict[str, Any]) -> str:
+
+def convert_entry(entry: Dict[str, Any], depth: int = 0) -> str:
     """Convert a single log entry to Markdown."""
     type_ = entry.get('type')
-    
+    h1 = _heading(1, depth)
+    h2 = _heading(2, depth)
+
     if type_ == 'user_message':
         content_blocks = entry.get('content', [])
-        md = "# User Message\n\n"
+        parts = [f"{h1} User Message\n\n"]
         for block in content_blocks:
+            if not isinstance(block, dict):
+                continue
             block_type = block.get('type')
             if block_type == 'text':
                 text = block.get('text', '')
-                md += f"{text}\n\n"
-        return md
-    
+                parts.append(f"{text}\n\n")
+        return ''.join(parts)
+
     elif type_ == 'assistant_message':
         content_blocks = entry.get('content', [])
-        md = ""
+        parts = []
         for block in content_blocks:
+            if not isinstance(block, dict):
+                continue
             block_type = block.get('type')
             if block_type == 'text':
                 text = block.get('text', '')
-                md += f"## Assistant Text\n\n{text}\n\n"
+                parts.append(f"{h2} Assistant Text\n\n{text}\n\n")
             elif block_type == 'tool_use':
                 name = block.get('name', '')
                 input_ = block.get('input', {})
-                md += f"## Tool Call: {name}\n\n"
+                parts.append(f"{h2} Tool Call: {name}\n\n")
                 if 'code' in input_:
-                    md += f"```python\n{input_['code']}\n```\n\n"
+                    parts.append(f"```python\n{input_['code']}\n```\n\n")
                 else:
                     input_str = json.dumps(input_, indent=2)
-                    md += f"```json\n{input_str}\n```\n\n"
+                    parts.append(f"```json\n{input_str}\n```\n\n")
             elif block_type == 'thinking':
                 thinking = block.get('thinking', '')
-                md += f"## Thinking\n\n{thinking}\n\n"
-        return md
-    
+                parts.append(f"{h2} Thinking\n\n{thinking}\n\n")
+        return ''.join(parts)
+
     elif type_ == 'tool_result':
-        result = entry.get('result', {})
+        result = entry.get('result')
+        if not isinstance(result, dict):
+            result = {}
         stdout = result.get('stdout', '')
         stderr = result.get('stderr', '')
-        md = "## Tool Result\n\n"
+        parts = [f"{h2} Tool Result\n\n"]
         if stdout:
-            md += f"**Stdout:**\n\n```\n{stdout}\n```\n\n"
+            parts.append(f"**Stdout:**\n\n```\n{stdout}\n```\n\n")
         if stderr:
-            md += f"**Stderr:**\n\n```\n{stderr}\n```\n\n"
-        return md
-    
+            parts.append(f"**Stderr:**\n\n```\n{stderr}\n```\n\n")
+        # Registry tools log their return value; limit hits add error and message
+        if 'result' in result:
+            value = result['result']
+            if not isinstance(value, str):
+                value = json.dumps(value, indent=2, ensure_ascii=False)
+            parts.append(f"**Result:**\n\n```\n{value}\n```\n\n")
+        if result.get('error'):
+            parts.append(f"**Error:** {result['error']}\n\n")
+        if result.get('message'):
+            parts.append(f"{result['message']}\n\n")
+        return ''.join(parts)
+
     elif type_ == 'final_result':
         result = entry.get('result', '')
-        return f"# Final Result\n\n{result}\n\n"
-    
+        return f"{h1} Final Result\n\n{result}\n\n"
+
+    elif type_ == 'compaction':
+        return (
+            f"{h2} Compaction\n\n"
+            f"Compacted {entry.get('compacted_results')} tool results "
+            f"({entry.get('before_tokens')} -> {entry.get('after_tokens')} estimated tokens, "
+            f"mode {entry.get('mode')}).\n\n"
+        )
+
+    elif type_ == 'budget_warning':
+        return f"{h2} Budget Warning\n\nAlmost out of {entry.get('reason')} budget: {entry.get('usage')}\n\n"
+
+    elif type_ == 'budget_exhausted':
+        return (
+            f"{h1} Stopped Early ({entry.get('reason')})\n\n"
+            f"Usage: {entry.get('usage')}\n\n"
+            f"Partial result:\n\n{entry.get('partial', '')}\n\n"
+        )
+
+    elif type_ == 'agent_resumed':
+        if entry.get('status') == 'done':
+            return f"{h1} Agent {entry.get('agent_id')} Resumed (already done)\n\nResult:\n\n{entry.get('result')}\n\n"
+        return (
+            f"{h1} Agent {entry.get('agent_id')} Resumed from run {entry.get('resumed_run')}\n\n"
+            f"REPL state: {entry.get('mode')}\n\n"
+            f"Usage so far: {entry.get('usage')}\n\n"
+        )
+
+    elif type_ == 'batch_task':
+        return f"{h1} Batch Task {entry.get('task_id')}: {entry.get('status')} ({entry.get('latency', 0):.1f}s)\n\n"
+
+    elif type_ == 'agent_cache_hit':
+        return (
+            f"{h2} Memoized Sub-agent ({entry.get('source')})\n\n"
+            f"Context: {entry.get('context_head', '')}\n\n"
+            f"Result: {entry.get('result', '')}\n\n"
+        )
+
+    else:
+        return f"{h2} Unknown Entry Type: {type_}\n\n```json\n{json.dumps(entry, indent=2)}\n```\n\n"
+
+
+def open_log(path: str) -> IO[bytes]:
+    """Open a JSONL log, transparently decompressing rotated `.gz` logs."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+@contextlib.contextmanager
+def open_seekable_log(path: str) -> Iterator[IO[bytes]]:
+    """Open a log for random access.
+
+    Seeking backwards in a gzip stream decompresses it again from the start,
+    so `.gz` logs are first decompressed to a temporary file.
+    """
+    if not path.endswith('.gz'):
+        with open(path, 'rb') as f:
+            yield f
+        return
+    with gzip.open(path, 'rb') as compressed, tempfile.TemporaryFile() as f:
+        shutil.copyfileobj(compressed, f)
+        f.seek(0)
+        yield f
+
+
+def iter_entries(f: IO[bytes]) -> Iterator[Tuple[int, int, Optional[Dict[str, Any]], str]]:
+    """Yield `(offset, line_num, entry, raw_line)` for each non-empty line.
+
+    `entry` is None when the line is not a valid JSON object.
+    """
+    offset = f.tell()
+    for line_num, raw in enumerate(f, 1):
+        line = raw.decode('utf-8', errors='replace').strip()
+        if line:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                entry = None
+            if not isinstance(entry, dict):
+                entry = None
+            yield offset, line_num, entry, line
+        offset += len(raw)
+
+
+def _parse_error(line_num: int, line: str) -> str:
+    try:
+        json.loads(line)
+    except json.JSONDecodeError as e:
+        error = str(e)
     else:
-        return f"## Unknown Entry Type: {type_}\n\n```json\n{json.dumps(entry, indent=2)}\n```\n\n"
+        error = 'Not a JSON object'
+    return f"## JSON Parse Error at line {line_num}\n\n{error}\n\nLine content: {line}\n\n"
+
+
+class _Span:
+    """Layout of one agent span: its entries interleaved with child spans."""
+
+    __slots__ = ('depth', 'offsets', 'line_nums', 'children')
+
+    def __init__(self, depth: int):
+        self.depth = depth
+        self.offsets = array('Q')
+        self.line_nums = array('Q')
+        # (number of own entries seen before the child started, child span id)
+        self.children: List[Tuple[int, str]] = []
+
+
+def convert_flat(log_path: str, out: IO[str]) -> None:
+    """Convert entries in file order."""
+    with open_log(log_path) as f:
+        for _, line_num, entry, line in iter_entries(f):
+            if entry is None:
+                out.write(_parse_error(line_num, line))
+            else:
+                out.write(convert_entry(entry))
+
+
+def convert_tree(log_path: str, out: IO[str]) -> None:
+    """Convert entries grouped into nested per-agent sections.
+
+    The first pass records only byte offsets per span; the second pass seeks
+    back to each entry, so memory does not grow with the size of the entries.
+    """
+    spans: Dict[str, _Span] = {}
+    roots: List[str] = []
+    with open_seekable_log(log_path) as f:
+        for offset, line_num, entry, _ in iter_entries(f):
+            span_id = str(entry.get('span_id')) if entry is not None else 'None'
+            span = spans.get(span_id)
+            if span is None:
+                depth = entry.get('depth', 0) if entry is not None else 0
+                span = spans[span_id] = _Span(depth if isinstance(depth, int) else 0)
+                parent_id = entry.get('parent_span_id') if entry is not None else None
+                parent = spans.get(str(parent_id)) if parent_id is not None else None
+                if parent is not None:
+                    parent.children.append((len(parent.offsets), span_id))
+                else:
+                    roots.append(span_id)
+            span.offsets.append(offset)
+            span.line_nums.append(line_num)
+
+        def write_entry(offset: int, line_num: int, depth: int) -> None:
+            f.seek(offset)
+            line = f.readline().decode('utf-8', errors='replace').strip()
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                entry = None
+            if isinstance(entry, dict):
+                # Two heading levels per depth: one for the section, one for its entries
+                out.write(convert_entry(entry, 2 * depth))
+            else:
+                out.write(_parse_error(line_num, line))
+
+        # Iterative depth-first walk so deep recursion cannot overflow the stack
+        stack: List[Tuple[str, int, int]] = [(span_id, 0, 0) for span_id in reversed(roots)]
+        while stack:
+            span_id, entry_index, child_index = stack.pop()
+            span = spans[span_id]
+            if entry_index == 0 and child_index == 0 and span.depth > 0:
+                out.write(f"{_heading(0, 2 * span.depth)} Sub-agent `{span_id}` (depth {span.depth})\n\n")
+            while entry_index < len(span.offsets):
+                if child_index < len(span.children) and span.children[child_index][0] <= entry_index:
+                    break
+                write_entry(span.offsets[entry_index], span.line_nums[entry_index], span.depth)
+                entry_index += 1
+            if child_index < len(span.children):
+                stack.append((span_id, entry_index, child_index + 1))
+                stack.append((span.children[child_index][1], 0, 0))
+
+
+def markdown_path(log_path: str) -> str:
+    if log_path.endswith('.gz'):
+        log_path = log_path[:-3]
+    return log_path.replace('.jsonl', '.md')
+
+
+def convert_file(log_path: str, flat: bool = False) -> str:
+    """Convert one log to Markdown next to it and return the output path."""
+    md_path = markdown_path(log_path)
+    with open(md_path, 'w', encoding='utf-8') as out:
+        if flat:
+            convert_flat(log_path, out)
+        else:
+            convert_tree(log_path, out)
+    return md_path
+
+
+# `error` values of run_python results stopped by a timeout or resource limit
+LIMIT_ERRORS = ('timeout', 'memory_limit', 'cpu_limit')
+
+
+def _new_stats() -> Dict[str, Any]:
+    return {
+        'entries': 0,
+        'agents': set(),
+        'max_depth': 0,
+        'iterations': 0,
+        'tool_calls': 0,
+        'tool_results': 0,
+        'output_chars': 0,
+        'errors': 0,
+        'parse_errors': 0,
+        'compactions': 0,
+        'memo_hits': 0,
+        'budget_stops': 0,
+        'limit_hits': 0,
+        'llm_latency': 0.0,
+        'repl_latency': 0.0,
+        'input_tokens': 0,
+        'output_tokens': 0,
+        'first_ts': None,
+        'last_ts': None,
+    }
+
+
+def collect_stats(log_path: str) -> Dict[str, Dict[str, Any]]:
+    """Aggregate a log per run ID in one streaming pass."""
+    runs: Dict[str, Dict[str, Any]] = {}
+    with open_log(log_path) as f:
+        for _, _, entry, _ in iter_entries(f):
+            run_id = str(entry.get('run_id', os.path.basename(log_path))) if entry else os.path.basename(log_path)
+            stats = runs.setdefault(run_id, _new_stats())
+            stats['entries'] += 1
+            if entry is None:
+                stats['parse_errors'] += 1
+                continue
+            stats['agents'].add(entry.get('span_id'))
+            stats['max_depth'] = max(stats['max_depth'], entry.get('depth') or 0)
+            ts = entry.get('ts')
+            if isinstance(ts, (int, float)):
+                stats['first_ts'] = ts if stats['first_ts'] is None else min(stats['first_ts'], ts)
+                stats['last_ts'] = ts if stats['last_ts'] is None else max(stats['last_ts'], ts)
+            type_ = entry.get('type')
+            if type_ == 'assistant_message':
+                stats['iterations'] += 1
+                stats['tool_calls'] += sum(
+                    1
+                    for block in entry.get('content') or []
+                    if isinstance(block, dict) and block.get('type') == 'tool_use'
+                )
+                stats['llm_latency'] += entry.get('latency') or 0.0
+                usage = entry.get('usage') or {}
+                stats['input_tokens'] += usage.get('input_tokens') or 0
+                stats['output_tokens'] += usage.get('output_tokens') or 0
+            elif type_ == 'tool_result':
+                result = entry.get('result')
+                if not isinstance(result, dict):
+                    result = {}
+                stdout = result.get('stdout', '')
+                stderr = result.get('stderr', '')
+                stats['tool_results'] += 1
+                stats['output_chars'] += entry.get('output_chars', len(stdout) + len(stderr))
+                # Registry tool failures and run_python limit hits set `error`
+                if result.get('error') or stderr or 'Traceback (most recent call last)' in stdout:
+                    stats['errors'] += 1
+                if result.get('error') in LIMIT_ERRORS:
+                    stats['limit_hits'] += 1
+                stats['repl_latency'] += entry.get('latency') or 0.0
+            elif type_ == 'compaction':
+                stats['compactions'] += 1
+            elif type_ == 'agent_cache_hit':
+                stats['memo_hits'] += 1
+            elif type_ == 'budget_exhausted':
+                stats['budget_stops'] += 1
+    for stats in runs.values():
+        stats['agents'] = len(stats['agents'])
+    return runs
+
+
+def format_stats(log_path: str, runs: Dict[str, Dict[str, Any]]) -> str:
+    lines = [f"{log_path}:"]
+    for run_id, s in runs.items():
+        lines.append(f"  run {run_id}:")
+        lines.append(f"    entries: {s['entries']} ({s['parse_errors']} unparseable)")
+        lines.append(f"    agents: {s['agents']} (max depth {s['max_depth']}), iterations: {s['iterations']}")
+        lines.append(f"    tool calls: {s['tool_calls']}, results: {s['tool_results']}, errors: {s['errors']}")
+        lines.append(f"    output chars: {s['output_chars']}")
+        lines.append(f"    compactions: {s['compactions']}, memoized sub-agents: {s['memo_hits']}")
+        if s['budget_stops'] or s['limit_hits']:
+            lines.append(
+                f"    agents stopped by budget: {s['budget_stops']}, "
+                f"executions stopped by REPL limits: {s['limit_hits']}"
+            )
+        if s['input_tokens'] or s['output_tokens']:
+            lines.append(f"    tokens: {s['input_tokens']} in, {s['output_tokens']} out")
+        if s['llm_latency'] or s['repl_latency']:
+            lines.append(f"    time: LLM {s['llm_latency']:.2f}s, REPL {s['repl_latency']:.2f}s")
+        if s['first_ts'] is not None:
+            lines.append(f"    wall clock: {s['last_ts'] - s['first_ts']:.2f}s")
+    return '\n'.join(lines)
+
+
+def _process(log_path: str, stats: bool, flat: bool) -> str:
+    if stats:
+        return format_stats(log_path, collect_stats(log_path))
+    return f"Markdown written to {convert_file(log_path, flat)}"
+
+
+def find_logs(path: str) -> List[str]:
+    """Return the log files in a directory such as `.rlm/`."""
+    return sorted(
+        os.path.join(path, name)
+        for name in os.listdir(path)
+        if name.endswith('.jsonl') or name.endswith('.jsonl.gz')
+    )
 
 
 def main():
     parser = argparse.ArgumentParser(description='Convert RLM JSONL log to Markdown')
-    parser.add_argument('log_file', help='Path to the JSONL log file')
+    parser.add_argument('log_file', help='Path to the JSONL log file, or a directory of logs such as .rlm/')
+    parser.add_argument('--stats', action='store_true', help='Print per-run aggregates instead of writing Markdown')
+    parser.add_argument('--flat', action='store_true', help='Keep file order instead of nesting sub-agents')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Parallel workers for a directory of logs')
     args = parser.parse_args()
-    
+
     log_path = args.log_file
     if not os.path.exists(log_path):
         print(f"Error: File {log_path} does not exist.", file=sys.stderr)
         sys.exit(1)
-    
-    md_path = log_path.replace('.jsonl', '.md')
-    
-    try:
-        with open(log_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-    except IOError as e:
-        print(f"Error reading file {log_path}: {e}", file=sys.stderr)
-        sys.exit(1)
-    
-    md_content = ""
-    for line_num, line in enumerate(lines, 1):
-        line = line.strip()
-        if not line:
-            continue
-        try:
-            entry = json.loads(line)
-            md_content += convert_entry(entry)
-        except json.JSONDecodeError as e:
-            md_content += f"## JSON Parse Error at line {line_num}\n\n{e}\n\nLine content: {line}\n\n"
-    
-    try:
-        with open(md_path, 'w', encoding='utf-8') as f:
-            f.write(md_content)
-    except IOError as e:
-        print(f"Error writing to {md_path}: {e}", file=sys.stderr)
+
+    log_paths = find_logs(log_path) if os.path.isdir(log_path) else [log_path]
+    failed = False
+    if len(log_paths) > 1 and (args.jobs or 1) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = [pool.submit(_process, p, args.stats, args.flat) for p in log_paths]
+            for p, future in zip(log_paths, futures):
+                try:
+                    print(future.result())
+                except (IOError, OSError) as e:
+                    print(f"Error processing {p}: {e}", file=sys.stderr)
+                    failed = True
+    else:
+        for p in log_paths:
+            try:
+                print(_process(p, args.stats, args.flat))
+            except (IOError, OSError) as e:
+                print(f"Error processing {p}: {e}", file=sys.stderr)
+                failed = True
+    if failed:
         sys.exit(1)
-    
-    print(f"Markdown written to {md_path}")
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()